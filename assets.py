@@ -0,0 +1,73 @@
+"""Сборка статики: отпечаток содержимого в имени файла и предварительное сжатие.
+
+flask build-static копирует css/js из static/ в static/dist/ под именами вида
+css/style.3f2a9c1b7d4e.css, кладет рядом .gz (и .br, если установлен пакет
+brotli) и пишет manifest.json: исходное имя -> имя с отпечатком. Имя меняется
+вместе с содержимым, поэтому такие файлы отдаются с Cache-Control: immutable
+на год. Старые версии не удаляются: страницы из кэша браузера продолжают
+ссылаться на них до следующей загрузки.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+EXTENSIONS = ('.css', '.js')
+
+
+def fingerprinted_name(path, data):
+    base, ext = os.path.splitext(path)
+    return f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_assets(static_folder):
+    """Сборка static/dist; возвращает манифест {исходное имя: имя с отпечатком}"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            if not name.endswith(EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            target = os.path.join(dist, fingerprinted_name(path, data))
+            write_file(target, data)
+            # mtime=0: одинаковый вход дает байт-в-байт одинаковый .gz
+            write_file(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                write_file(target + '.br', brotli.compress(data, quality=11))
+
+            manifest[path] = fingerprinted_name(path, data)
+
+    # Манифест подменяется целиком: запущенное приложение не прочитает его наполовину
+    manifest_path = os.path.join(dist, MANIFEST_NAME)
+    write_file(manifest_path + '.tmp', json.dumps(manifest, indent=2, sort_keys=True).encode())
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Манифест собранной статики или пустой словарь, если сборки не было"""
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
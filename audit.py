@@ -0,0 +1,202 @@
+"""Журнал аудита: входы, переводы, удаление аккаунтов, доступ к админке.
+
+record() только добавляет кортеж в collections.deque: append атомарен под
+GIL, поэтому на пути запроса нет ни блокировок, ни обращений к БД. Фоновый
+поток забирает события пачками - когда в буфере набралось batch_size или
+прошло flush_seconds - и пишет их в приемник: таблицу audit_log (только
+INSERT) или локальный файл JSON Lines с ротацией по размеру.
+
+Буфер ограничен max_buffer: если приемник не успевает (медленная или
+заблокированная таблица), record() отбрасывает старейшие события и считает
+их в dropped, так что память не растет и на пути запроса.
+
+Оставшееся в буфере дописывается при штатной остановке процесса (atexit и
+хук worker_exit в gunicorn.conf.py). При аварийном завершении теряется не
+больше, чем накоплено за flush_seconds.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+
+# Журналы процесса: при выходе каждый дописывает свой буфер
+_logs = weakref.WeakSet()
+
+_now = time.time
+
+
+def event_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class DatabaseSink:
+    """Пачка событий одним INSERT в таблицу model в собственном контексте приложения"""
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+
+    def write(self, events):
+        rows = [{
+            'created_at': event_time(timestamp),
+            'action': action,
+            'user_id': user_id,
+            'ip_address': ip,
+            'details': json.dumps(details, ensure_ascii=False, default=str) if details else None
+        } for timestamp, action, user_id, ip, details in events]
+
+        with self.app.app_context():
+            try:
+                self.db.session.execute(self.db.insert(self.model), rows)
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                raise
+
+
+class FileSink:
+    """Дописывание в файл JSON Lines; при превышении max_bytes файл сдвигается в .1, .2, ...
+
+    В пути можно указать {pid}: у каждого воркера свой файл, и ротация одного
+    процесса не мешает записи другого.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def _rotate(self, path):
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{path}.{i}'):
+                os.replace(f'{path}.{i}', f'{path}.{i + 1}')
+        os.replace(path, f'{path}.1')
+
+    def write(self, events):
+        path = self.path.format(pid=os.getpid())
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.backup_count and os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+            self._rotate(path)
+
+        lines = ''.join(json.dumps({
+            'created_at': event_time(timestamp).isoformat(),
+            'action': action,
+            'user_id': user_id,
+            'ip_address': ip,
+            'details': details
+        }, ensure_ascii=False, default=str) + '\n' for timestamp, action, user_id, ip, details in events)
+
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class AuditLog:
+    def __init__(self, sink, batch_size=500, flush_seconds=1.0, max_buffer=100000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self._reported_dropped = 0
+        self.failures = 0
+        # Журнал создается лениво в первом запросе воркера, так что поток уже не переживает fork
+        self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+        self._thread.start()
+        _logs.add(self)
+
+    def record(self, action, user_id=None, ip=None, details=None):
+        """Постановка события в буфер (без блокировок и ввода-вывода)"""
+        buffer = self._buffer
+        if len(buffer) >= self.max_buffer:
+            # Приемник не успевает - отбрасываем старейшее. Гонка между потоками
+            # допустима: буфер лишь чуть меньше предела, dropped - приблизительно
+            try:
+                buffer.popleft()
+                self.dropped += 1
+            except IndexError:
+                pass
+        buffer.append((_now(), action, user_id, ip, details))
+        # Event.set() берет блокировку - будим поток один раз, а не на каждом событии
+        if len(buffer) >= self.batch_size and not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Запись всего накопленного пачками по batch_size; возвращает число записанных"""
+        written = 0
+        with self._flush_lock:
+            buffer = self._buffer
+            while buffer:
+                popleft = buffer.popleft
+                batch = [popleft() for _ in range(min(len(buffer), self.batch_size))]
+                try:
+                    self.sink.write(batch)
+                except Exception as e:
+                    # Приемник недоступен - возвращаем пачку в начало буфера до следующей попытки
+                    self.failures += 1
+                    buffer.extendleft(reversed(batch))
+                    self._trim()
+                    print(f"❌ Аудит: не удалось записать {len(batch)} событий: {e}")
+                    break
+                written += len(batch)
+            self.written += written
+            if self.dropped != self._reported_dropped:
+                print(f"⚠️ Аудит: буфер переполнен, всего отброшено {self.dropped} старейших событий")
+                self._reported_dropped = self.dropped
+        return written
+
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            for _ in range(overflow):
+                self._buffer.popleft()
+            self.dropped += overflow
+
+    def close(self, timeout=5.0):
+        """Остановка потока и запись остатка буфера"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return self.flush()
+
+    def detach(self):
+        """После fork: буфер и поток принадлежат родительскому процессу, здесь их не пишем"""
+        self._closed = True
+        self._buffer.clear()
+        _logs.discard(self)
+
+    def stats(self):
+        return {
+            'buffered': len(self._buffer),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failures': self.failures
+        }
+
+
+def close_all():
+    for log in list(_logs):
+        log.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,75 @@
+"""Бенчмарк журнала аудита: python bench_audit.py [--events 1000000] [--threads 4]
+
+Меряет стоимость record() на пути запроса (цель - меньше микросекунды на
+событие) и пропускную способность фоновой записи в файл. Код возврата 1,
+если цель не достигнута.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from audit import AuditLog, FileSink
+
+TARGET_NS_PER_EVENT = 1000
+
+
+class NullSink:
+    def write(self, events):
+        pass
+
+
+def record_many(log, count, user_id):
+    details = {'path': '/dashboard'}
+    record = log.record
+    for _ in range(count):
+        record('admin.access', user_id, '127.0.0.1', details)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк журнала аудита')
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    # 1. Стоимость record(): приемник ничего не делает. Считаем процессорное время
+    # только вызывающего потока - работа фонового потока на путь запроса не ложится
+    log = AuditLog(NullSink(), batch_size=500, flush_seconds=1.0, max_buffer=args.events)
+    started = time.thread_time()
+    record_many(log, args.events, 1)
+    elapsed = time.thread_time() - started
+    ns_per_event = elapsed / args.events * 1e9
+    log.close()
+    print(f"record(): {args.events} событий за {elapsed:.2f} с CPU -> {ns_per_event:.0f} нс на событие")
+
+    # 2. Несколько потоков запросов и запись в файл с ротацией
+    with tempfile.TemporaryDirectory() as directory:
+        sink = FileSink(os.path.join(directory, 'audit-{pid}.jsonl'), max_bytes=10 * 1024 * 1024)
+        log = AuditLog(sink, batch_size=500, flush_seconds=0.2, max_buffer=args.events)
+        per_thread = args.events // args.threads
+        threads = [threading.Thread(target=record_many, args=(log, per_thread, i)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.close()
+        elapsed = time.perf_counter() - started
+        total = per_thread * args.threads
+        files = len(os.listdir(directory))
+        print(f"Файл: {log.written} из {total} событий за {elapsed:.2f} с -> "
+              f"{log.written / elapsed:,.0f} соб/с, файлов после ротации {files}")
+
+    if log.written != total:
+        print("❌ Часть событий потеряна")
+        sys.exit(1)
+    if ns_per_event > TARGET_NS_PER_EVENT:
+        print(f"❌ record() дороже цели {TARGET_NS_PER_EVENT} нс")
+        sys.exit(1)
+    print(f"✅ Цель {TARGET_NS_PER_EVENT} нс на событие достигнута, потерь нет")
+
+
+if __name__ == '__main__':
+    main()
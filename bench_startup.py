@@ -0,0 +1,56 @@
+"""Бенчмарк холодного старта: python bench_startup.py [--runs 10] [--config testing]
+
+Каждый прогон - отдельный интерпретатор: импорт app, create_app() и первый
+запрос к главной странице через тестовый клиент. Печатает медиану и максимум
+по каждой фазе.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app(sys.argv[1])
+t2 = time.perf_counter()
+response = app.test_client().get('/')
+t3 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2}))
+'''
+
+
+def run_once(config_name):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, config_name],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_total'] = time.perf_counter() - started
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк холодного старта приложения')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='testing')
+    args = parser.parse_args()
+
+    runs = [run_once(args.config) for _ in range(args.runs)]
+
+    print(f"Прогонов: {args.runs}, конфигурация: {args.config}")
+    for phase in ('import', 'create_app', 'first_request', 'process_total'):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"  {phase:<14} медиана {statistics.median(values):7.1f} мс   макс {max(values):7.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Бенчмарк velocity-проверок: python bench_velocity.py [--checks 200000] [--accounts 10000]
+
+Проверяет, что движок выдерживает не менее 10 000 проверок в секунду
+на одном ядре при заполненных окнах. Код возврата 1, если цель не достигнута.
+"""
+import argparse
+import random
+import sys
+import time
+
+from velocity import VelocityEngine, VelocityLimits
+
+TARGET_CHECKS_PER_SECOND = 10000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк velocity-проверок')
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--history', type=int, default=100000, help='переводов для прогрева')
+    args = parser.parse_args()
+
+    engine = VelocityEngine(VelocityLimits(
+        max_transfers=20, max_amount=500000, new_recipient_threshold=100000, max_incoming=50
+    ))
+    rng = random.Random(42)
+    now = time.time()
+
+    history = [
+        (rng.randrange(args.accounts), rng.randrange(args.accounts),
+         rng.uniform(100, 50000), now - rng.uniform(0, 3600))
+        for _ in range(args.history)
+    ]
+    started = time.perf_counter()
+    engine.warm_start(history)
+    warm_seconds = time.perf_counter() - started
+
+    requests = [
+        (rng.randrange(args.accounts), rng.randrange(args.accounts), rng.uniform(100, 200000))
+        for _ in range(args.checks)
+    ]
+    started = time.perf_counter()
+    denied = 0
+    for account_id, recipient_id, amount in requests:
+        if not engine.check(account_id, recipient_id, amount, now).allowed:
+            denied += 1
+    elapsed = time.perf_counter() - started
+
+    rate = args.checks / elapsed
+    print(f"Прогрев: {args.history} переводов за {warm_seconds:.2f} с")
+    print(f"Проверок: {args.checks} за {elapsed:.2f} с -> {rate:,.0f} пров/с, "
+          f"{elapsed / args.checks * 1e6:.1f} мкс на проверку, отказов {denied}")
+
+    if rate < TARGET_CHECKS_PER_SECOND:
+        print(f"❌ Ниже цели {TARGET_CHECKS_PER_SECOND:,} пров/с")
+        sys.exit(1)
+    print(f"✅ Цель {TARGET_CHECKS_PER_SECOND:,} пров/с достигнута")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Группы маршрутов: auth, banking, admin, api, static_assets"""
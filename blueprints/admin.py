@@ -0,0 +1,221 @@
+from datetime import datetime, timezone
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
+
+from extensions import db, get_audit
+from http_cache import conditional
+from models import User, Account, Transaction, ScheduledTransfer, OutboxEvent, scheduled_run_at
+from services import (
+    audit_event, balance_totals, latest_transactions, merge_balance_totals, merge_latest_transactions,
+    query_audit, transactions_state
+)
+from sharding import fan_out, sharding_enabled
+
+bp = Blueprint('admin', __name__)
+
+@bp.before_request
+def audit_admin_access():
+    """Каждое обращение к админке в журнал аудита, включая отказы в доступе"""
+    audit_event('admin.access', method=request.method, path=request.full_path.rstrip('?'),
+                allowed=session.get('role') == 'admin')
+
+STAT_COUNTERS = ('total_users', 'active_users', 'total_accounts', 'active_accounts', 'total_transactions')
+
+def shard_stats():
+    """Сводка одного шарда для главной страницы админки"""
+    transactions = Transaction.query
+    if sharding_enabled():
+        # Межшардовый перевод записан в обоих шардах - считаем его в шарде отправителя
+        transactions = transactions.filter(db.or_(
+            Transaction.sender_account_id.is_(None),
+            Transaction.sender_account_id.in_(db.select(Account.id))
+        ))
+    
+    return {
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(is_active=True).count(),
+        'total_accounts': Account.query.count(),
+        'active_accounts': Account.query.filter_by(status='active').count(),
+        'total_transactions': transactions.count(),
+        'recent_users': User.query.order_by(User.created_at.desc()).limit(10).all(),
+        'recent_transactions': latest_transactions(10),
+        'totals': balance_totals()
+    }
+
+@bp.route('/admin')
+def admin():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        flash('Доступ запрещен', 'danger')
+        return redirect('/dashboard')
+    
+    # Шарды опрашиваются параллельно, сводки складываются
+    parts = fan_out(shard_stats)
+    stats = {name: sum(part[name] for part in parts) for name in STAT_COUNTERS}
+    recent_users = sorted((user for part in parts for user in part['recent_users']),
+                          key=lambda user: user.created_at, reverse=True)[:10]
+    recent_transactions = merge_latest_transactions([part['recent_transactions'] for part in parts], 10)
+    totals = merge_balance_totals([part['totals'] for part in parts])
+    
+    return render_template('admin.html',
+                         **stats,
+                         total_balance=totals['total'],
+                         base_currency=totals['base'],
+                         balances_by_currency=totals['by_currency'],
+                         recent_users=recent_users,
+                         recent_transactions=recent_transactions)
+
+@bp.route('/admin_panel')
+def admin_panel():
+    return redirect(url_for('admin.admin'))
+
+@bp.route('/admin/import', methods=['POST'])
+def admin_import():
+    """Массовое открытие счетов из загруженного CSV/JSON"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    from bulk_import import parse_rows, detect_format, import_users
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Выберите файл для импорта', 'danger')
+        return redirect(url_for('admin.admin'))
+    
+    try:
+        rows = parse_rows(upload.read(), detect_format(upload.filename))
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f'Не удалось прочитать файл: {e}', 'danger')
+        return redirect(url_for('admin.admin'))
+    
+    report = import_users(
+        rows,
+        initial_balance=current_app.config['BULK_IMPORT_INITIAL_BALANCE'],
+        batch_size=current_app.config['BULK_IMPORT_BATCH_SIZE'],
+        hash_workers=current_app.config['BULK_IMPORT_HASH_WORKERS']
+    )
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(report.to_dict())
+    
+    flash(f'Импорт: создано {report.created} из {report.total}, '
+          f'{report.rows_per_second:.0f} строк/с', 'success' if report.created else 'warning')
+    for error in report.errors[:10]:
+        flash(f"Строка {error['row']} ({error['email'] or 'без email'}): {'; '.join(error['errors'])}", 'danger')
+    if len(report.errors) > 10:
+        flash(f'...и еще {len(report.errors) - 10} строк с ошибками', 'danger')
+    return redirect(url_for('admin.admin'))
+
+def users_dicts():
+    # Словари строятся в шарде: to_dict обращается к счетам пользователя
+    return [user.to_dict() for user in User.query.all()]
+
+@bp.route('/admin/users')
+def admin_users():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    users = [user for part in fan_out(users_dicts) for user in part]
+    return jsonify(sorted(users, key=lambda user: user['id']))
+
+def admin_transactions_state():
+    # Не-администратору версию не раскрываем: ответ 403 формирует само представление
+    return transactions_state() if session.get('role') == 'admin' else None
+
+@bp.route('/admin/transactions')
+@conditional(admin_transactions_state)
+def admin_transactions():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    transactions = merge_latest_transactions(fan_out(latest_transactions, 100), 100)
+    return jsonify([trans.to_dict() for trans in transactions])
+
+def queue_stats(model, now):
+    """Размер и самый старый элемент очереди шарда: просроченные плановые переводы
+    или неотправленные события outbox"""
+    if model is ScheduledTransfer:
+        waiting = (ScheduledTransfer.status == 'active', scheduled_run_at <= now)
+        since = scheduled_run_at
+    else:
+        waiting = (OutboxEvent.status == 'pending',)
+        since = OutboxEvent.created_at
+    
+    count, oldest = db.session.query(db.func.count(model.id), db.func.min(since)).filter(*waiting).one()
+    by_status = dict(db.session.query(model.status, db.func.count(model.id)).group_by(model.status).all())
+    return count, oldest, by_status
+
+def merge_queue_stats(parts):
+    by_status = {}
+    for _, _, shard_by_status in parts:
+        for status, count in shard_by_status.items():
+            by_status[status] = by_status.get(status, 0) + count
+    oldest = [shard_oldest for _, shard_oldest, _ in parts if shard_oldest]
+    return sum(count for count, _, _ in parts), min(oldest) if oldest else None, by_status
+
+@bp.route('/admin/scheduler')
+def admin_scheduler():
+    """Очередь плановых переводов: сколько просрочено и насколько"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    now = datetime.utcnow()
+    due_count, oldest_due, by_status = merge_queue_stats(fan_out(queue_stats, ScheduledTransfer, now))
+    
+    return jsonify({
+        'due': due_count,
+        'lag_seconds': (now - oldest_due).total_seconds() if oldest_due else 0,
+        'by_status': by_status
+    })
+
+@bp.route('/admin/outbox')
+def admin_outbox():
+    """Состояние очереди outbox: размер и возраст самого старого события"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    now = datetime.utcnow()
+    pending_count, oldest_pending, by_status = merge_queue_stats(fan_out(queue_stats, OutboxEvent, now))
+    
+    return jsonify({
+        'pending': pending_count,
+        'lag_seconds': (now - oldest_pending).total_seconds() if oldest_pending else 0,
+        'by_status': by_status
+    })
+
+def parse_utc(value):
+    """ISO 8601 -> naive UTC, как хранятся даты в БД"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@bp.route('/admin/audit')
+def admin_audit():
+    """Журнал аудита: ?user_id=&action=&since=&until= (ISO 8601, UTC)&limit="""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    if current_app.config['AUDIT_SINK'] != 'database':
+        return jsonify({'error': 'Журнал аудита пишется в файл, запросы к нему недоступны'}), 400
+    
+    try:
+        since, until = (parse_utc(request.args.get(name)) for name in ('since', 'until'))
+    except ValueError:
+        return jsonify({'error': 'Некорректная дата, ожидается ISO 8601'}), 400
+    
+    # Свежие события этого процесса еще в буфере - дописываем перед чтением
+    get_audit().flush()
+    
+    records = query_audit(
+        user_id=request.args.get('user_id', type=int),
+        action=request.args.get('action'),
+        since=since,
+        until=until,
+        limit=min(request.args.get('limit', 100, type=int), 1000)
+    )
+    return jsonify({
+        'records': [record.to_dict() for record in records],
+        'buffer': get_audit().stats()
+    })
@@ -0,0 +1,89 @@
+from flask import Blueprint, request, session, jsonify
+from sqlalchemy import or_
+
+from extensions import db, get_fx_rates
+from http_cache import conditional
+from models import User, Account
+from services import latest_transactions, merge_latest_transactions, monthly_totals, transactions_state
+from sharding import fan_out
+
+bp = Blueprint('api', __name__)
+
+# Списки собираются со всех шардов параллельно; словари строятся внутри шарда,
+# пока доступны связи (владелец счета)
+
+def users_dicts():
+    return [user.to_dict() for user in User.query.all()]
+
+def accounts_dicts():
+    return [acc.to_dict() for acc in Account.query.all()]
+
+@bp.route('/api/users')
+def api_users():
+    users = [user for part in fan_out(users_dicts) for user in part]
+    return jsonify(sorted(users, key=lambda user: user['id']))
+
+@bp.route('/api/accounts')
+def api_accounts():
+    accounts = [acc for part in fan_out(accounts_dicts) for acc in part]
+    return jsonify(sorted(accounts, key=lambda acc: acc['id']))
+
+@bp.route('/api/transactions')
+@conditional(transactions_state)
+def api_transactions():
+    transactions = merge_latest_transactions(fan_out(latest_transactions, 100), 100)
+    return jsonify([trans.to_dict() for trans in transactions])
+
+@bp.route('/api/analytics/monthly')
+def api_monthly_analytics():
+    """Помесячные входящие/исходящие суммы текущего пользователя для графиков"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Войдите в систему'}), 401
+    
+    months = min(request.args.get('months', 12, type=int), 120)
+    account_ids = [acc_id for (acc_id,) in db.session.query(Account.id).filter_by(user_id=session['user_id'])]
+    
+    return jsonify({
+        'currency': get_fx_rates().snapshot().base,
+        'months': monthly_totals(account_ids, months)
+    })
+
+def find_accounts(query, current_user_id):
+    accounts = Account.query.join(User).filter(
+        Account.user_id != current_user_id,
+        Account.status == 'active',
+        or_(
+            Account.account_number.ilike(f'%{query}%'),
+            User.full_name.ilike(f'%{query}%'),
+            User.email.ilike(f'%{query}%')
+        )
+    ).limit(10).all()
+
+    accounts_list = []
+    for acc in accounts:
+        accounts_list.append({
+            'account_number': acc.account_number,
+            'owner_name': acc.owner.full_name if acc.owner else 'Неизвестно',
+            'balance': acc.balance,
+            'account_type': acc.account_type
+        })
+    return accounts_list
+
+@bp.route('/api/search_accounts', methods=['GET'])
+def search_accounts():
+    """API для поиска счетов по номеру или имени владельца"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Войдите в систему'}), 401
+    
+    current_user_id = session['user_id']
+    query = request.args.get('q', '').strip()
+    
+    if not query or len(query) < 2:
+        return jsonify({'accounts': []})
+    
+    try:
+        found = [acc for part in fan_out(find_accounts, query, current_user_id) for acc in part]
+        return jsonify({'accounts': found[:10]})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,202 @@
+from flask import Blueprint, render_template, request, redirect, flash, session
+
+from extensions import db
+from models import User, Account
+from services import (
+    audit_event, generate_account_number, validate_email, validate_password,
+    validate_full_name, validate_phone
+)
+from sharding import current_shard, find_user_by_email, forget_new_user, place_new_user, register_account
+
+bp = Blueprint('auth', __name__)
+
+# ==================== ИСПРАВЛЕННЫЙ МАРШРУТ РЕГИСТРАЦИИ ====================
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if 'user_id' in session:
+        return redirect('/dashboard')
+    
+    if request.method == 'POST':
+        full_name = request.form.get('full_name', '').strip()
+        email = request.form.get('email', '').strip()
+        phone = request.form.get('phone', '').strip()
+        password = request.form.get('password', '')
+        confirm_password = request.form.get('confirm_password', '')
+        
+        errors = []
+        
+        # Валидация ФИО
+        name_errors = validate_full_name(full_name)
+        if name_errors:
+            errors.extend(name_errors)
+        elif not full_name:
+            errors.append('Введите ФИО')
+        
+        # Валидация email
+        if not email:
+            errors.append('Введите email')
+        elif not validate_email(email):
+            errors.append('Некорректный email')
+        else:
+            # Проверяем существование пользователя
+            existing_user = find_user_by_email(email)
+            if existing_user:
+                errors.append('Пользователь с таким email уже существует')
+        
+        # Валидация пароля
+        if not password:
+            errors.append('Введите пароль')
+        else:
+            pass_errors = validate_password(password)
+            if pass_errors:
+                errors.extend(pass_errors)
+        
+        # Проверка подтверждения пароля
+        if not confirm_password:
+            errors.append('Подтвердите пароль')
+        elif password != confirm_password:
+            errors.append('Пароли не совпадают')
+        
+        # Валидация телефона (не обязателен)
+        if phone:
+            phone_errors = validate_phone(phone)
+            if phone_errors:
+                errors.extend(phone_errors)
+        
+        # Если есть ошибки - показываем их
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+            return render_template('register.html', 
+                                 full_name=full_name, 
+                                 email=email, 
+                                 phone=phone)
+        else:
+            # id и шард созданного пользователя - для компенсации, если регистрация прервется
+            user_id = shard = None
+            try:
+                # Создаем нового пользователя
+                new_user = User(
+                    full_name=full_name,
+                    email=email,
+                    phone=phone if phone else None,
+                    role='client'
+                )
+                new_user.set_password(password)
+                
+                # При шардировании id и шард выдает глобальный каталог
+                place_new_user(new_user)
+                user_id, shard = new_user.id, current_shard()
+                db.session.add(new_user)
+                db.session.commit()
+                user_id = new_user.id
+                
+                # Генерируем номер счета
+                account_number = generate_account_number(new_user.id, 'current')
+                
+                # Убеждаемся, что номер счета ровно 20 символов
+                if len(account_number) != 20:
+                    if len(account_number) < 20:
+                        account_number = account_number.ljust(20, '0')
+                    else:
+                        account_number = account_number[:20]
+                
+                # Создаем счет
+                new_account = Account(
+                    user_id=new_user.id,
+                    account_number=account_number,
+                    account_type='current',
+                    balance=10000.00
+                )
+                register_account(new_account)
+                db.session.add(new_account)
+                db.session.commit()
+                
+                flash(f'Регистрация успешна! Ваш номер счета: {account_number}', 'success')
+                flash('Теперь вы можете войти в систему', 'info')
+                return redirect('/login')
+                
+            except Exception as e:
+                db.session.rollback()
+                error_msg = str(e)
+                print(f"Ошибка при регистрации: {error_msg}")
+                if user_id is not None:
+                    try:
+                        forget_new_user(user_id, shard)
+                    except Exception as cleanup_error:
+                        db.session.rollback()
+                        print(f"❌ Не удалось удалить незавершенную регистрацию {user_id}: {cleanup_error}")
+                
+                # Более понятные сообщения об ошибках
+                if 'unique constraint' in error_msg.lower() and 'email' in error_msg.lower():
+                    flash('Пользователь с таким email уже существует', 'danger')
+                elif 'unique constraint' in error_msg.lower() and 'account_number' in error_msg.lower():
+                    flash('Ошибка генерации номера счета. Попробуйте еще раз.', 'danger')
+                else:
+                    flash(f'Ошибка при регистрации: {error_msg}', 'danger')
+                
+                return render_template('register.html', 
+                                     full_name=full_name, 
+                                     email=email, 
+                                     phone=phone)
+    
+    # GET запрос - просто показываем форму
+    return render_template('register.html')
+
+# ==================== МАРШРУТ ЛОГИНА ====================
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if 'user_id' in session:
+        return redirect('/dashboard')
+    
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip()
+        password = request.form.get('password', '')
+        
+        # Базовая валидация
+        if not email:
+            flash('Введите email', 'danger')
+            return render_template('login.html')
+        
+        if not password:
+            flash('Введите пароль', 'danger')
+            return render_template('login.html')
+        
+        try:
+            user = find_user_by_email(email)
+            
+            if user and user.check_password(password):
+                if not user.is_active:
+                    audit_event('login.blocked', user.id, email=email)
+                    flash('Ваш аккаунт заблокирован', 'danger')
+                    return render_template('login.html')
+                
+                session['user_id'] = user.id
+                session['email'] = user.email
+                session['full_name'] = user.full_name
+                session['role'] = user.role
+                session['shard'] = current_shard()
+                
+                user.update_last_login()
+                audit_event('login.success', user.id, email=email)
+                
+                flash(f'Добро пожаловать, {user.full_name}!', 'success')
+                return redirect('/dashboard')
+            else:
+                audit_event('login.failed', user.id if user else None, email=email)
+                flash('Неверный email или пароль', 'danger')
+                return render_template('login.html', email=email)
+                
+        except Exception as e:
+            flash('Ошибка при входе в систему', 'danger')
+            return render_template('login.html', email=email)
+    
+    return render_template('login.html')
+
+@bp.route('/logout')
+def logout():
+    session.clear()
+    flash('Вы вышли из системы', 'info')
+    return redirect('/')
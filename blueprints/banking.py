@@ -0,0 +1,443 @@
+from datetime import datetime, timedelta
+
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response, current_app
+)
+
+from extensions import db, get_broker
+from http_cache import conditional
+from models import User, Account, Transaction, ScheduledTransfer, local_to_utc, scheduled_run_at, user_zone, utc_to_local
+from saga import transfer_across_shards
+from services import (
+    TransferError, TransferPending, account_numbers, apply_transfer, audit_event, balance_totals,
+    check_transfer_limit, check_velocity, currency_symbol, enqueue_outbox, internal_transfer_totals,
+    monthly_totals, publish_transfer_events, record_velocity, user_page_state
+)
+from sharding import current_shard, find_account_by_number, is_remote, shard_of_account
+
+bp = Blueprint('banking', __name__)
+
+# ==================== ИСПРАВЛЕННЫЙ МАРШРУТ ИСТОРИИ ====================
+
+@bp.route('/history')
+@conditional(user_page_state)
+def history():
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    user_accounts = Account.query.filter_by(user_id=user.id).all()
+    user_account_ids = [acc.id for acc in user_accounts]
+    account_currencies = {acc.id: acc.currency for acc in user_accounts}
+    
+    transactions = Transaction.query.filter(
+        (Transaction.sender_account_id.in_(user_account_ids)) |
+        (Transaction.receiver_account_id.in_(user_account_ids))
+    ).order_by(Transaction.created_at.desc()).all()
+    
+    # Статистика из помесячных итогов: O(месяцев), а не O(операций). Итоги знают только
+    # выполненные операции, а перевод между своими счетами считают с обеих сторон -
+    # входящую сторону вычитаем, чтобы он остался одной исходящей операцией
+    monthly = monthly_totals(user_account_ids)
+    internal_count, internal_amount = internal_transfer_totals(user_account_ids)
+    outgoing = sum(m['outgoing_count'] for m in monthly)
+    incoming = sum(m['incoming_count'] for m in monthly) - internal_count
+    total_amount = sum(m['outgoing_amount'] + m['incoming_amount'] for m in monthly) - internal_amount
+    
+    # Номера счетов одним запросом; счета других шардов - из глобального каталога
+    numbers = account_numbers([trans.sender_account_id for trans in transactions] +
+                              [trans.receiver_account_id for trans in transactions])
+    
+    transactions_list = []
+    for trans in transactions:
+        is_sender = trans.sender_account_id in user_account_ids
+        
+        transactions_list.append({
+            'date': trans.created_at.strftime('%d.%m.%Y %H:%M:%S'),
+            'type': 'outgoing' if is_sender else 'incoming',
+            'from_account': numbers.get(trans.sender_account_id, 'Пополнение'),
+            'to_account': numbers.get(trans.receiver_account_id),
+            'amount': trans.amount if is_sender else trans.credited_amount,
+            'currency': trans.currency if is_sender else account_currencies[trans.receiver_account_id],
+            'description': trans.description,
+            'status': trans.status,
+            'reference': trans.reference_number
+        })
+    
+    totals = balance_totals(Account.user_id == user.id)
+    
+    return render_template('history.html',
+                         transactions=transactions_list,
+                         stats={
+                             'total': outgoing + incoming,
+                             'outgoing': outgoing,
+                             'incoming': incoming,
+                             'total_amount': total_amount
+                         },
+                         total_balance=totals['total'],
+                         base_currency=totals['base'])
+
+# ==================== ОСТАЛЬНЫЕ МАРШРУТЫ ====================
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+@bp.route('/dashboard')
+@conditional(user_page_state)
+def dashboard():
+    if 'user_id' not in session:
+        flash('Войдите в систему', 'warning')
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    if not user:
+        session.clear()
+        flash('Пользователь не найден', 'danger')
+        return redirect('/login')
+    
+    accounts = Account.query.filter_by(user_id=user.id, status='active').all()
+    user_account_ids = [acc.id for acc in accounts]
+    
+    transactions = Transaction.query.filter(
+        (Transaction.sender_account_id.in_(user_account_ids)) |
+        (Transaction.receiver_account_id.in_(user_account_ids))
+    ).order_by(Transaction.created_at.desc()).limit(5).all()
+    
+    accounts_list = [acc.to_dict() for acc in accounts]
+    account_currencies = {acc.id: acc.currency for acc in accounts}
+    
+    transactions_list = []
+    for trans in transactions:
+        is_sender = trans.sender_account_id in user_account_ids
+        transactions_list.append({
+            'date': trans.created_at.strftime('%d.%m.%Y %H:%M'),
+            'description': trans.description or 'Без описания',
+            'amount': -trans.amount if is_sender else trans.credited_amount,
+            'currency': trans.currency if is_sender else account_currencies.get(trans.receiver_account_id, trans.currency),
+            'type': 'outgoing' if is_sender else 'incoming',
+            'reference': trans.reference_number
+        })
+    
+    totals = balance_totals(Account.user_id == user.id, Account.status == 'active')
+    
+    return render_template('dashboard.html',
+                         user=session,
+                         accounts=accounts_list,
+                         transactions=transactions_list,
+                         total_balance=totals['total'],
+                         base_currency=totals['base'],
+                         balances_by_currency=totals['by_currency'])
+
+@bp.route('/events')
+def events():
+    """SSE-поток обновлений баланса и операций для личного кабинета"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Войдите в систему'}), 401
+    
+    broker = get_broker()
+    if not broker.acquire_stream():
+        # Все места под потоки заняты: клиент повторит позже, обычные запросы не ждут
+        response = jsonify({'error': 'Слишком много открытых подключений'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    response = Response(broker.stream(session['user_id']), mimetype='text/event-stream')
+    # Место освобождается при закрытии ответа, даже если генератор так и не запускался
+    response.call_on_close(broker.release_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/transfer', methods=['GET', 'POST'])
+def transfer():
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    accounts = Account.query.filter_by(user_id=user.id, status='active').all()
+    
+    if request.method == 'POST':
+        from_account_id = request.form.get('from_account')
+        to_account_number = request.form.get('to_account', '').strip()
+        amount = request.form.get('amount', '0')
+        description = request.form.get('description', '').strip()
+        
+        errors = []
+        
+        try:
+            amount_float = float(amount)
+            if amount_float <= 0:
+                errors.append('Сумма должна быть больше 0')
+        except:
+            errors.append('Некорректная сумма')
+        
+        if not from_account_id:
+            errors.append('Выберите счет списания')
+        else:
+            from_account = Account.query.get(from_account_id)
+            if not from_account:
+                errors.append('Выбранный счет не существует')
+            elif from_account.user_id != user.id:
+                errors.append('Это не ваш счет')
+            elif from_account.balance < amount_float:
+                errors.append('Недостаточно средств на счете')
+            else:
+                try:
+                    check_transfer_limit(amount_float, from_account.currency)
+                except TransferError as e:
+                    errors.append(str(e))
+        
+        if not to_account_number or len(to_account_number) != 20 or not to_account_number.isdigit():
+            errors.append('Некорректный номер счета (ровно 20 цифр)')
+        else:
+            # Глобальный индекс номеров: счет может быть в другом шарде
+            to_account = find_account_by_number(to_account_number)
+            if not to_account:
+                errors.append('Счет получателя не найден')
+            elif to_account.status != 'active':
+                errors.append('Счет получателя заблокирован')
+            elif to_account.id == from_account_id:
+                errors.append('Нельзя переводить на тот же счет')
+        
+        if errors:
+            audit_event('transfer.rejected', from_account=from_account_id,
+                        to_account=to_account_number, amount=amount, reasons=errors)
+            for error in errors:
+                flash(error, 'danger')
+        else:
+            try:
+                decision = check_velocity(from_account, to_account, amount_float)
+                if decision and not decision.allowed:
+                    raise TransferError('; '.join(decision.reasons))
+                
+                if is_remote(to_account):
+                    # Межшардовый перевод: сага сама фиксирует свои шаги в обоих шардах
+                    transaction, from_account, to_account = transfer_across_shards(
+                        from_account, to_account, current_shard(), shard_of_account(to_account.id),
+                        amount_float, description
+                    )
+                else:
+                    transaction, from_account, to_account = apply_transfer(
+                        from_account.id, to_account.id, amount_float, description
+                    )
+                if decision and decision.flags:
+                    # Перевод проходит, но уходит на ручную проверку
+                    enqueue_outbox('transfer.flagged', {
+                        'reference': transaction.reference_number,
+                        'sender_account_id': from_account.id,
+                        'receiver_account_id': to_account.id,
+                        'amount': amount_float,
+                        'currency': from_account.currency,
+                        'flags': decision.flags
+                    })
+                db.session.commit()
+                
+                record_velocity(transaction)
+                publish_transfer_events(transaction, from_account, to_account)
+                audit_event('transfer.completed', reference=transaction.reference_number,
+                            from_account=from_account.id, to_account=to_account.id,
+                            amount=amount_float, currency=from_account.currency,
+                            flags=decision.flags if decision else None)
+                
+                flash(f'Перевод на сумму {amount_float:.2f} {currency_symbol(from_account.currency)} выполнен успешно!', 'success')
+                if transaction.exchange_rate is not None:
+                    flash(f'Зачислено {transaction.receiver_amount:.2f} {currency_symbol(to_account.currency)} '
+                          f'по курсу {transaction.exchange_rate:.4f}', 'info')
+                flash(f'Номер транзакции: {transaction.reference_number}', 'info')
+                return redirect('/dashboard')
+                
+            except TransferPending as e:
+                # Деньги могли уже списаться - не пишем об ошибке, сагу доведет recover_sagas()
+                db.session.rollback()
+                audit_event('transfer.pending', reference=e.reference, from_account=from_account.id,
+                            to_account=to_account.id, amount=amount_float, error=str(e.__cause__))
+                flash(f'{e}: результат появится в истории операций', 'warning')
+                return redirect('/dashboard')
+            except TransferError as e:
+                db.session.rollback()
+                audit_event('transfer.rejected', from_account=from_account.id,
+                            to_account=to_account.id, amount=amount_float, reasons=[str(e)])
+                flash(str(e), 'danger')
+            except Exception as e:
+                db.session.rollback()
+                audit_event('transfer.failed', from_account=from_account.id,
+                            to_account=to_account.id, amount=amount_float, error=str(e))
+                flash(f'Ошибка при выполнении перевода: {str(e)}', 'danger')
+    
+    accounts_list = [acc.to_dict() for acc in accounts]
+    
+    # Получаем всех пользователей для подсказок
+    all_users = []
+    try:
+        all_users_with_accounts = User.query.filter(
+            User.id != user.id,
+            User.is_active == True
+        ).all()
+        
+        all_users = []
+        for u in all_users_with_accounts:
+            user_dict = u.to_dict()
+            user_dict['accounts'] = Account.query.filter_by(user_id=u.id).all()
+            all_users.append(user_dict)
+            
+    except Exception as e:
+        print(f"Ошибка при получении пользователей: {e}")
+    
+    return render_template('transfer.html', 
+                         accounts=accounts_list,
+                         all_users=all_users[:10])
+
+@bp.route('/scheduled', methods=['GET', 'POST'])
+def scheduled_transfers():
+    """Плановые переводы пользователя: список и создание"""
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    accounts = Account.query.filter_by(user_id=user.id, status='active').all()
+    
+    if request.method == 'POST':
+        from_account_id = request.form.get('from_account', type=int)
+        to_account_number = request.form.get('to_account', '').strip()
+        frequency = request.form.get('frequency', 'once')
+        description = request.form.get('description', '').strip()
+        start_at = request.form.get('start_at', '').strip()
+        zone = user_zone(request.form.get('timezone', '').strip(), current_app.config['SCHEDULER_TIMEZONE'])
+        
+        errors = []
+        
+        try:
+            amount_float = float(request.form.get('amount', '0'))
+            if amount_float <= 0:
+                errors.append('Сумма должна быть больше 0')
+        except ValueError:
+            amount_float = 0
+            errors.append('Некорректная сумма')
+        
+        from_account = Account.query.get(from_account_id) if from_account_id else None
+        if not from_account or from_account.user_id != user.id:
+            errors.append('Выберите счет списания')
+        elif amount_float > 0:
+            # Тот же лимит проверит и воркер при каждом запуске - здесь отказываем сразу
+            try:
+                check_transfer_limit(amount_float, from_account.currency)
+            except TransferError as e:
+                errors.append(str(e))
+        
+        to_account = find_account_by_number(to_account_number)
+        if not to_account:
+            errors.append('Счет получателя не найден')
+        elif to_account.status != 'active':
+            errors.append('Счет получателя заблокирован')
+        elif from_account and to_account.id == from_account.id:
+            errors.append('Нельзя переводить на тот же счет')
+        
+        if frequency not in ScheduledTransfer.FREQUENCIES:
+            errors.append('Некорректная периодичность')
+        
+        now = datetime.utcnow()
+        try:
+            # В форме местное время клиента, в БД - UTC
+            local_start_at = datetime.strptime(start_at, '%Y-%m-%dT%H:%M') if start_at else utc_to_local(now, zone)
+            next_run_at = local_to_utc(local_start_at, zone)
+            # Воркер сдвигает срок на один период за запуск - прошедшая дата дала бы
+            # серию переводов подряд за все пропущенные периоды
+            if next_run_at < now - timedelta(minutes=1):
+                errors.append('Дата первого перевода уже прошла')
+        except ValueError:
+            errors.append('Некорректная дата первого перевода')
+        
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+        else:
+            scheduled = ScheduledTransfer(
+                user_id=user.id,
+                from_account_id=from_account.id,
+                to_account_id=to_account.id,
+                amount=amount_float,
+                description=description or None,
+                frequency=frequency,
+                next_run_at=next_run_at,
+                timezone_name=zone.key,
+                local_start_at=local_start_at
+            )
+            db.session.add(scheduled)
+            db.session.commit()
+            flash('Плановый перевод создан', 'success')
+            return redirect(url_for('banking.scheduled_transfers'))
+    
+    scheduled = ScheduledTransfer.query.filter_by(user_id=user.id).filter(
+        ScheduledTransfer.status.in_(['active', 'failed'])
+    ).order_by(scheduled_run_at).all()
+    
+    # Счет получателя из другого шарда показываем по номеру из глобального каталога
+    remote_numbers = account_numbers([item.to_account_id for item in scheduled if not item.to_account])
+    scheduled_list = []
+    for item in scheduled:
+        item_dict = item.to_dict()
+        item_dict['to_account'] = item_dict['to_account'] or remote_numbers.get(item.to_account_id)
+        scheduled_list.append(item_dict)
+    
+    return render_template('scheduled.html',
+                         accounts=[acc.to_dict() for acc in accounts],
+                         scheduled=scheduled_list,
+                         frequencies=ScheduledTransfer.FREQUENCIES)
+
+@bp.route('/scheduled/<int:scheduled_id>/cancel', methods=['POST'])
+def cancel_scheduled_transfer(scheduled_id):
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    scheduled = ScheduledTransfer.query.filter_by(id=scheduled_id, user_id=session['user_id']).first()
+    if not scheduled:
+        flash('Плановый перевод не найден', 'danger')
+    else:
+        scheduled.status = 'cancelled'
+        db.session.commit()
+        flash('Плановый перевод отменен', 'info')
+    
+    return redirect(url_for('banking.scheduled_transfers'))
+
+@bp.route('/profile')
+def profile():
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    accounts = Account.query.filter_by(user_id=user.id).all()
+    
+    user_data = user.to_dict()
+    user_data['phone'] = user.phone
+    user_data['address'] = user.address
+    user_data['last_login'] = user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else 'Никогда'
+    user_data['accounts'] = [acc.to_dict() for acc in accounts]
+    
+    return render_template('profile.html', user=user_data)
+
+@bp.route('/delete_account', methods=['POST'])
+def delete_account():
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    user = User.query.get(session['user_id'])
+    
+    if user.role == 'admin':
+        audit_event('account.delete_denied', user.id)
+        flash('Администратор не может удалить свой аккаунт', 'danger')
+    else:
+        try:
+            user.is_active = False
+            db.session.commit()
+            audit_event('account.deleted', user.id, email=user.email)
+            
+            session.clear()
+            flash('Ваш аккаунт успешно удален', 'success')
+            return redirect('/')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при удалении аккаунта: {str(e)}', 'danger')
+    
+    return redirect('/profile')
@@ -0,0 +1,42 @@
+import mimetypes
+import os
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from werkzeug.utils import safe_join
+
+from assets import DIST_DIR
+from extensions import get_asset_manifest
+
+bp = Blueprint('assets', __name__)
+
+# Порядок предпочтения заранее сжатых вариантов
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+@bp.app_template_global()
+def asset_url(filename):
+    """Ссылка на файл статики: с отпечатком, если статика собрана flask build-static"""
+    fingerprinted = get_asset_manifest().get(filename)
+    if fingerprinted:
+        return url_for('assets.asset', filename=fingerprinted)
+    return url_for('static', filename=filename)
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Собранная статика: готовый .br/.gz без сжатия на лету и кэш на год"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    max_age = current_app.config['ASSETS_MAX_AGE']
+    mimetype = mimetypes.guess_type(filename)[0]
+
+    for encoding, suffix in ENCODINGS:
+        compressed = safe_join(dist, filename + suffix)
+        if request.accept_encodings[encoding] and compressed and os.path.isfile(compressed):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype, max_age=max_age)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
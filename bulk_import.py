@@ -0,0 +1,262 @@
+"""Массовое открытие счетов по списку сотрудников (CSV или JSON).
+
+Строки проверяются теми же валидаторами, что и форма регистрации.
+Уникальность email проверяется одним запросом на весь файл, пароли
+хешируются в пуле процессов, пользователи и их счета вставляются пачками.
+При шардировании id выдает глобальный каталог, а пачка раскладывается по
+шардам: в каждый шард - один INSERT пользователей и один INSERT счетов.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from extensions import db, get_shards
+from models import User, Account, UserDirectory, AccountDirectory
+from services import (
+    generate_account_number, validate_email, validate_phone,
+    validate_full_name, validate_password
+)
+from sharding import delete_directory_entries, delete_user_rows, sharding_enabled
+
+FIELDS = ('full_name', 'email', 'phone', 'password', 'address')
+
+# Ниже этого количества пул процессов дороже самого хеширования
+POOL_THRESHOLD = 8
+
+
+class ImportReport:
+    def __init__(self, total=0):
+        self.total = total
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, email, messages):
+        self.errors.append({'row': row_number, 'email': email, 'errors': messages})
+
+    @property
+    def rows_per_second(self):
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1)
+        }
+
+
+def parse_rows(data, fmt):
+    """Строки файла в виде словарей с полями FIELDS"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+
+    if fmt == 'json':
+        rows = json.loads(data)
+        if isinstance(rows, dict):
+            rows = rows.get('users', [])
+        if not isinstance(rows, list):
+            raise ValueError('JSON должен содержать список пользователей')
+    elif fmt == 'csv':
+        rows = list(csv.DictReader(io.StringIO(data)))
+    else:
+        raise ValueError(f'Неподдерживаемый формат: {fmt}')
+
+    return [
+        {field: str(row.get(field) or '').strip() for field in FIELDS}
+        if isinstance(row, dict) else {}
+        for row in rows
+    ]
+
+
+def detect_format(filename):
+    return 'json' if filename.lower().endswith('.json') else 'csv'
+
+
+def validate_row(row):
+    errors = list(validate_full_name(row.get('full_name', '')))
+
+    email = row.get('email', '')
+    if not email:
+        errors.append('Введите email')
+    elif not validate_email(email):
+        errors.append('Некорректный email')
+
+    password = row.get('password', '')
+    if not password:
+        errors.append('Введите пароль')
+    else:
+        errors.extend(validate_password(password))
+
+    errors.extend(validate_phone(row.get('phone', '')))
+    return errors
+
+
+def hash_passwords(passwords, workers=None):
+    """Хеширование паролей; для больших списков - параллельно в пуле процессов"""
+    if len(passwords) < POOL_THRESHOLD or workers == 1:
+        return [generate_password_hash(p) for p in passwords]
+
+    # spawn: форк из многопоточного веб-воркера может унаследовать захваченные блокировки
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        chunksize = max(1, len(passwords) // ((workers or multiprocessing.cpu_count()) * 4))
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def existing_emails(emails):
+    """Email из списка, уже занятые в БД (один запрос на пачку)"""
+    # При шардировании все email есть в глобальном каталоге основной БД
+    email_column = UserDirectory.email if sharding_enabled() else User.email
+    found = set()
+    emails = list(emails)
+    for i in range(0, len(emails), 1000):
+        chunk = emails[i:i + 1000]
+        found.update(email for (email,) in db.session.query(email_column).filter(email_column.in_(chunk)))
+    return found
+
+
+def user_values(row):
+    return {
+        'full_name': row['full_name'],
+        'email': row['email'],
+        'phone': row['phone'] or None,
+        'address': row['address'] or None,
+        'password_hash': row['password_hash'],
+        'role': 'client',
+        'is_active': True
+    }
+
+
+def account_values(user_id, initial_balance):
+    return {
+        'user_id': user_id,
+        'account_number': generate_account_number(user_id, 'current'),
+        'account_type': 'current',
+        'balance': initial_balance,
+        'currency': 'RUB',
+        'status': 'active'
+    }
+
+
+def insert_users(rows, initial_balance):
+    """Пачечная вставка пользователей и их текущих счетов в одной транзакции"""
+    if sharding_enabled():
+        return insert_users_sharded(rows, initial_balance)
+
+    created = db.session.execute(
+        db.insert(User).returning(User.id, sort_by_parameter_order=True),
+        [user_values(row) for row in rows]
+    ).scalars().all()
+
+    db.session.execute(db.insert(Account), [account_values(user_id, initial_balance) for user_id in created])
+
+    return len(created)
+
+
+def insert_shard_rows(users, accounts):
+    db.session.execute(db.insert(User), users)
+    db.session.execute(db.insert(Account), accounts)
+    db.session.commit()
+
+
+def insert_users_sharded(rows, initial_balance):
+    """id из каталога пачкой, затем вставка в шарды.
+
+    Каталог фиксируется первым, потом шарды по одному. Если шард отказал,
+    строки пачки удаляются из уже зафиксированных шардов и из каталога: email
+    в шарде уникален, и без этой компенсации повтор той же строки упал бы на
+    оставшейся в шарде записи. Сбой самой компенсации оставит в каталоге
+    email без пользователя - его видно в выборке user_directory без строки в шарде.
+    """
+    router = get_shards()
+    user_ids = db.session.execute(
+        db.insert(UserDirectory).returning(UserDirectory.user_id, sort_by_parameter_order=True),
+        [{'email': row['email']} for row in rows]
+    ).scalars().all()
+    shards = {user_id: router.shard_for_new_user(user_id) for user_id in user_ids}
+    db.session.execute(db.update(UserDirectory), [
+        {'user_id': user_id, 'shard': shard} for user_id, shard in shards.items()
+    ])
+
+    accounts = [account_values(user_id, initial_balance) for user_id in user_ids]
+    account_ids = db.session.execute(
+        db.insert(AccountDirectory).returning(AccountDirectory.account_id, sort_by_parameter_order=True),
+        [{'account_number': acc['account_number'], 'user_id': acc['user_id'], 'shard': shards[acc['user_id']]}
+         for acc in accounts]
+    ).scalars().all()
+
+    by_shard = {}
+    for user_id, row, account, account_id in zip(user_ids, rows, accounts, account_ids):
+        users, shard_accounts = by_shard.setdefault(shards[user_id], ([], []))
+        users.append({'id': user_id, **user_values(row)})
+        shard_accounts.append({'id': account_id, **account})
+
+    db.session.commit()
+
+    written = []
+    try:
+        for shard, (users, shard_accounts) in by_shard.items():
+            router.run_on(shard, insert_shard_rows, users, shard_accounts)
+            written.append(shard)
+    except Exception:
+        for shard in written:
+            router.run_on(shard, delete_user_rows, [user['id'] for user in by_shard[shard][0]])
+        delete_directory_entries(user_ids)
+        raise
+
+    return len(user_ids)
+
+
+def import_users(rows, initial_balance=10000.00, batch_size=500, hash_workers=None):
+    """Импорт подготовленных строк; возвращает ImportReport с ошибками по строкам"""
+    started = time.perf_counter()
+    report = ImportReport(len(rows))
+
+    valid = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        errors = validate_row(row)
+        email = row.get('email', '')
+        if email in seen:
+            errors.append('Email повторяется в файле')
+        seen.add(email)
+        if errors:
+            report.add_error(number, email, errors)
+        else:
+            valid.append((number, row))
+
+    taken = existing_emails(row['email'] for _, row in valid)
+    accepted = []
+    for number, row in valid:
+        if row['email'] in taken:
+            report.add_error(number, row['email'], ['Пользователь с таким email уже существует'])
+        else:
+            accepted.append((number, row))
+
+    hashes = hash_passwords([row['password'] for _, row in accepted], hash_workers)
+    for (_, row), password_hash in zip(accepted, hashes):
+        row['password_hash'] = password_hash
+
+    for i in range(0, len(accepted), batch_size):
+        batch = accepted[i:i + batch_size]
+        try:
+            report.created += insert_users([row for _, row in batch], initial_balance)
+            db.session.commit()
+        except Exception as e:
+            # Конфликт с параллельной регистрацией или номером счета - пачка не создана
+            db.session.rollback()
+            for number, row in batch:
+                report.add_error(number, row['email'], [f'Ошибка сохранения пачки: {e.__class__.__name__}'])
+
+    report.errors.sort(key=lambda error: error['row'])
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,151 @@
+"""Pub/sub событий для Server-Sent Events (баланс и новые операции)"""
+import json
+import queue
+import threading
+import time
+
+
+class MemoryBackend:
+    """Внутрипроцессный брокер: подписчики живут в том же процессе, что и перевод"""
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Медленный клиент не должен тормозить перевод - событие теряется,
+                # клиент догонит состояние при следующей загрузке страницы
+                pass
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+
+class RedisBackend:
+    """Брокер через Redis pub/sub для нескольких воркеров gunicorn.
+
+    Каждый процесс держит одно соединение-слушатель и раздает сообщения
+    своим локальным подписчикам через MemoryBackend.
+    """
+
+    def __init__(self, url, channel_prefix='bank:events:', max_queue_size=100):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для EVENTS_BACKEND=redis установите пакет redis')
+
+        self.channel_prefix = channel_prefix
+        self._redis = redis.Redis.from_url(url)
+        self._local = MemoryBackend(max_queue_size)
+        self._pubsub = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._pubsub is not None:
+                return
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.psubscribe(**{self.channel_prefix + '*': self._on_message})
+            self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, raw):
+        channel = raw['channel'].decode()
+        user_id = int(channel[len(self.channel_prefix):])
+        self._local.publish(user_id, json.loads(raw['data']))
+
+    def publish(self, user_id, message):
+        self._redis.publish(f'{self.channel_prefix}{user_id}', json.dumps(message))
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return self._local.subscribe(user_id)
+
+    def unsubscribe(self, user_id, q):
+        self._local.unsubscribe(user_id, q)
+
+
+class EventBroker:
+    """Фасад над бэкендом: публикация событий пользователю и SSE-поток.
+
+    Число одновременных потоков в процессе ограничено max_streams: каждый
+    держит поток воркера gthread, и без ограничения несколько открытых вкладок
+    занимают весь воркер. Поток закрывается через stream_seconds - браузер сам
+    переподключается, а место достается следующему клиенту.
+    """
+
+    def __init__(self, backend=None, heartbeat_seconds=15, max_streams=4, stream_seconds=300):
+        self.backend = backend or MemoryBackend()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stream_seconds = stream_seconds
+        self._slots = threading.BoundedSemaphore(max_streams)
+
+    def acquire_stream(self):
+        """Место для нового потока без ожидания; False - все места заняты"""
+        return self._slots.acquire(blocking=False)
+
+    def release_stream(self):
+        self._slots.release()
+
+    def publish(self, user_id, event, data):
+        try:
+            self.backend.publish(user_id, {'event': event, 'data': data})
+        except Exception as e:
+            # Событие - лишь подсказка клиенту, перевод уже зафиксирован
+            print(f"Ошибка публикации события {event}: {e}")
+
+    def stream(self, user_id):
+        """Генератор SSE-сообщений; heartbeat не дает прокси закрыть соединение"""
+        q = self.backend.subscribe(user_id)
+        deadline = time.monotonic() + self.stream_seconds
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    message = q.get(timeout=min(self.heartbeat_seconds, remaining))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                payload = json.dumps(message['data'], ensure_ascii=False)
+                yield f"event: {message['event']}\ndata: {payload}\n\n"
+        finally:
+            self.backend.unsubscribe(user_id, q)
+
+
+def create_broker(config):
+    """Создание брокера по настройкам EVENTS_* из конфигурации"""
+    backend_name = config.get('EVENTS_BACKEND', 'memory')
+    queue_size = config.get('EVENTS_QUEUE_SIZE', 100)
+
+    if backend_name == 'memory':
+        backend = MemoryBackend(queue_size)
+    elif backend_name == 'redis':
+        backend = RedisBackend(config.get('EVENTS_REDIS_URL', 'redis://localhost:6379/0'),
+                               max_queue_size=queue_size)
+    else:
+        raise ValueError(f'Неизвестный EVENTS_BACKEND: {backend_name}')
+
+    return EventBroker(backend,
+                       heartbeat_seconds=config.get('EVENTS_HEARTBEAT_SECONDS', 15),
+                       max_streams=config.get('EVENTS_MAX_STREAMS', 4),
+                       stream_seconds=config.get('EVENTS_STREAM_SECONDS', 300))
@@ -0,0 +1,138 @@
+"""Расширения приложения.
+
+Объекты создаются без привязки к конкретному приложению и подключаются в
+create_app(). Брокер событий, кэш курсов, velocity-движок, журнал аудита и
+манифест статики создаются лениво при первом обращении внутри запроса: при
+запуске gunicorn --preload мастер не открывает соединений и не запускает
+потоков, которые не переживут fork.
+"""
+import threading
+
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Table, inspect
+
+
+def _target_table(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table
+    table = getattr(clause, 'table', None)
+    return table if isinstance(table, Table) else None
+
+
+class RoutingSession(Session):
+    """Сессия с выбором шарда: таблицы с info['sharded'] идут в шард из session.info['shard']"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and current_app.config['SHARDS']:
+            table = _target_table(mapper, clause)
+            if table is not None and table.info.get('sharded'):
+                shard = self.info.get('shard')
+                if shard is None:
+                    raise RuntimeError(f'Запрос к таблице {table.name} без выбранного шарда')
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+_lock = threading.Lock()
+
+
+def _lazy(name, factory):
+    extensions = current_app.extensions
+    value = extensions.get(name)
+    if value is None:
+        with _lock:
+            value = extensions.get(name)
+            if value is None:
+                value = extensions[name] = factory(current_app.config)
+    return value
+
+
+def _make_broker(config):
+    from events import create_broker
+    return create_broker(config)
+
+
+def _make_fx_rates(config):
+    from fx import RateCache
+    return RateCache(config['FX_RATES_FILE'], config['FX_REFRESH_SECONDS'])
+
+
+def _make_velocity(config):
+    from velocity import VelocityEngine, VelocityLimits
+    return VelocityEngine(
+        VelocityLimits(
+            max_transfers=config['VELOCITY_MAX_TRANSFERS'],
+            max_amount=config['VELOCITY_MAX_AMOUNT'],
+            new_recipient_threshold=config['VELOCITY_NEW_RECIPIENT_THRESHOLD'],
+            max_incoming=config['VELOCITY_MAX_INCOMING']
+        ),
+        window_seconds=config['VELOCITY_WINDOW_SECONDS'],
+        buckets=config['VELOCITY_BUCKETS'],
+        max_accounts=config['VELOCITY_MAX_ACCOUNTS']
+    )
+
+
+def _make_audit(config):
+    from audit import AuditLog, DatabaseSink, FileSink
+    if config['AUDIT_SINK'] == 'file':
+        sink = FileSink(config['AUDIT_FILE'], config['AUDIT_FILE_MAX_BYTES'], config['AUDIT_FILE_BACKUPS'])
+    else:
+        from models import AuditLog as AuditLogModel
+        sink = DatabaseSink(current_app._get_current_object(), db, AuditLogModel)
+    return AuditLog(
+        sink,
+        batch_size=config['AUDIT_BATCH_SIZE'],
+        flush_seconds=config['AUDIT_FLUSH_SECONDS'],
+        max_buffer=config['AUDIT_MAX_BUFFER']
+    )
+
+
+def _make_shards(config):
+    from sharding import ShardRouter
+    return ShardRouter(current_app._get_current_object(), config['SHARDS'], config['SHARD_FANOUT_WORKERS'])
+
+
+def _make_asset_manifest(config):
+    from assets import load_manifest
+    return load_manifest(current_app.static_folder)
+
+
+def get_broker():
+    return _lazy('bank.events', _make_broker)
+
+
+def get_fx_rates():
+    return _lazy('bank.fx', _make_fx_rates)
+
+
+def get_velocity():
+    return _lazy('bank.velocity', _make_velocity)
+
+
+def get_audit():
+    return _lazy('bank.audit', _make_audit)
+
+
+def get_shards():
+    return _lazy('bank.shards', _make_shards)
+
+
+def get_asset_manifest():
+    return _lazy('bank.assets', _make_asset_manifest)
+
+
+def reset_after_fork(app):
+    """Сброс состояния, унаследованного от мастер-процесса при fork"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: соединения родителя не закрываем, а просто забываем
+            engine.dispose(close=False)
+    for name in ('bank.events', 'bank.velocity', 'bank.shards'):
+        app.extensions.pop(name, None)
+    audit = app.extensions.pop('bank.audit', None)
+    if audit is not None:
+        audit.detach()
@@ -0,0 +1,96 @@
+"""Курсы валют: таблица из локального файла и атомарно обновляемый кэш"""
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+
+class RateSnapshot:
+    """Неизменяемый снимок курсов: rates[код] = сколько базовой валюты за 1 единицу"""
+
+    def __init__(self, base, rates, loaded_at, version):
+        self.base = base
+        self.rates = MappingProxyType(dict(rates))
+        self.loaded_at = loaded_at
+        self.version = version
+        # version у каждого процесса свой, а отпечаток одинаков для одинаковых курсов
+        self.fingerprint = hashlib.sha1(
+            json.dumps([base, sorted(self.rates.items())]).encode()
+        ).hexdigest()[:12]
+
+    def rate(self, currency):
+        try:
+            return self.rates[currency]
+        except KeyError:
+            raise ValueError(f'Нет курса для валюты {currency}')
+
+    def convert(self, amount, from_currency, to_currency):
+        """Пересчет суммы; курс кросс-пары считается через базовую валюту"""
+        if from_currency == to_currency:
+            return amount, 1.0
+        rate = self.rate(from_currency) / self.rate(to_currency)
+        return round(amount * rate, 2), rate
+
+
+def load_rates_file(path):
+    """Чтение файла вида {"base": "RUB", "rates": {"USD": 92.5, ...}}"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    base = data.get('base', 'RUB')
+    rates = {code.upper(): float(value) for code, value in data['rates'].items()}
+    rates[base] = 1.0
+
+    for code, value in rates.items():
+        if value <= 0:
+            raise ValueError(f'Некорректный курс {code}: {value}')
+
+    return base, rates
+
+
+class RateCache:
+    """Кэш курсов в памяти процесса.
+
+    Читатели берут текущий снимок одной ссылкой без блокировок. Перечитывание
+    файла (не чаще refresh_seconds и только при изменении mtime) собирает новый
+    снимок целиком и подменяет ссылку, поэтому запрос никогда не видит
+    наполовину обновленную таблицу.
+    """
+
+    def __init__(self, path, refresh_seconds=60):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtime = os.path.getmtime(self.path)
+            if not force and self._snapshot is not None and mtime == self._mtime:
+                return self._snapshot
+
+            base, rates = load_rates_file(self.path)
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            self._snapshot = RateSnapshot(base, rates, time.time(), version)
+            self._mtime = mtime
+            return self._snapshot
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            try:
+                return self.refresh()
+            except (OSError, ValueError) as e:
+                # Битый файл не должен ронять переводы - работаем на прежних курсах
+                print(f"Ошибка обновления курсов валют: {e}")
+        return snapshot
+
+    def convert(self, amount, from_currency, to_currency):
+        return self.snapshot().convert(amount, from_currency, to_currency)
@@ -0,0 +1,31 @@
+# Запуск: gunicorn -c gunicorn.conf.py wsgi:application
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+# SSE держит соединение открытым - нужны потоки, иначе один клиент займет воркер.
+# GUNICORN_WORKER_CLASS=gevent (pip install gevent) снимает ограничение на число потоков SSE
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+# Событие из одного воркера должно дойти до /events в другом - по умолчанию через Redis.
+# Под SSE в gthread отдаем не больше половины потоков, остальные - обычным запросам
+os.environ.setdefault('EVENTS_BACKEND', 'redis')
+os.environ.setdefault('EVENTS_MAX_STREAMS', str(max(threads // 2, 1)) if worker_class == 'gthread' else '1000')
+
+# Приложение загружается один раз в мастере и наследуется воркерами через fork.
+# Пулы соединений сбрасываются в дочернем процессе (см. os.register_at_fork в app.py).
+preload_app = True
+
+
+def on_starting(server):
+    # Память процесса не общая: при нескольких воркерах события терялись бы молча
+    if server.cfg.workers > 1 and os.environ['EVENTS_BACKEND'] == 'memory':
+        raise RuntimeError('EVENTS_BACKEND=memory работает только с одним воркером: '
+                           'задайте EVENTS_BACKEND=redis или GUNICORN_WORKERS=1')
+
+
+def worker_exit(server, worker):
+    # Буфер журнала аудита дописывается до выхода воркера (atexit страхует остальные пути)
+    from audit import close_all
+    close_all()
@@ -0,0 +1,65 @@
+"""Условные GET-запросы: ETag и Last-Modified по версии изменений данных.
+
+Декоратор conditional(state) получает версию данных страницы одним дешевым
+запросом (state() -> (версия, время изменения) или None). Если браузер
+прислал совпадающий If-None-Match (или If-Modified-Since не раньше
+изменения), отвечаем 304 без вызова представления: без запросов за данными
+и без рендеринга шаблона.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def is_fresh(etag, last_modified):
+    """Копия клиента актуальна; If-None-Match важнее If-Modified-Since"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        # В HTTP-датах нет долей секунды
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= request.if_modified_since
+    return False
+
+
+def conditional(state):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # flash-сообщения показываются один раз - такую страницу надо отрендерить
+            if (not current_app.config['HTTP_CACHE_ENABLED']
+                    or request.method not in ('GET', 'HEAD') or '_flashes' in session):
+                return view(*args, **kwargs)
+
+            current = state()
+            if current is None:
+                return view(*args, **kwargs)
+            version, last_modified = current
+
+            # Шаблон зависит от сессии (меню, роль) и от версии кода
+            etag = make_etag(current_app.config['RELEASE_ID'], session.get('user_id'),
+                             session.get('role'), request.path, version)
+
+            if is_fresh(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            # Личные данные: только в кэше браузера и с проверкой при каждом показе
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,377 @@
+import calendar
+import json
+import random
+import string
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from extensions import db
+
+
+def add_months(dt, months, day=None):
+    """Сдвиг даты на N месяцев с ограничением дня концом месяца (31.01 -> 28.02).
+    day - желаемое число месяца: после 28.02 перевод от 31.01 вернется на 31.03"""
+    month_index = dt.month - 1 + months
+    year = dt.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(day or dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+def user_zone(name, default):
+    """Часовой пояс из браузера (IANA); неизвестный или пустой - пояс по умолчанию"""
+    try:
+        return ZoneInfo(name) if name else ZoneInfo(default)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(default)
+
+def local_to_utc(dt, zone):
+    """Местное время без пояса -> naive UTC, как хранятся даты в БД"""
+    return dt.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+def utc_to_local(dt, zone):
+    return dt.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+
+# ==================== МОДЕЛИ БАЗЫ ДАННЫХ ====================
+# Таблицы с info={'sharded': True} при заданных SHARDS живут в шардах (см. sharding.py),
+# остальные - в основной БД
+class User(db.Model):
+    __table_args__ = {'info': {'sharded': True}}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    full_name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20))
+    address = db.Column(db.String(200))
+    role = db.Column(db.String(20), default='client')
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime)
+    
+    accounts = db.relationship('Account', backref='owner', lazy=True, cascade='all, delete-orphan')
+    sent_transactions = db.relationship('Transaction', foreign_keys='Transaction.sender_user_id', backref='sender', lazy=True)
+    received_transactions = db.relationship('Transaction', foreign_keys='Transaction.receiver_user_id', backref='receiver', lazy=True)
+    
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+    
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+    
+    def update_last_login(self):
+        self.last_login = datetime.utcnow()
+        db.session.commit()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'full_name': self.full_name,
+            'role': self.role,
+            'is_active': self.is_active,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'accounts_count': len(self.accounts)
+        }
+
+class Account(db.Model):
+    __table_args__ = {'info': {'sharded': True}}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    account_number = db.Column(db.String(20), unique=True, nullable=False)
+    account_type = db.Column(db.String(30), default='current')
+    balance = db.Column(db.Float, default=0.0, nullable=False)
+    currency = db.Column(db.String(3), default='RUB')
+    interest_rate = db.Column(db.Float, default=0.0)
+    status = db.Column(db.String(20), default='active')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    sent_transactions = db.relationship('Transaction', foreign_keys='Transaction.sender_account_id', backref='sender_account', lazy=True)
+    received_transactions = db.relationship('Transaction', foreign_keys='Transaction.receiver_account_id', backref='receiver_account', lazy=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account_number': self.account_number,
+            'account_type': self.account_type,
+            'balance': self.balance,
+            'currency': self.currency,
+            'status': self.status,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'user_name': self.owner.full_name if self.owner else None
+        }
+
+class Transaction(db.Model):
+    __tablename__ = 'transactions'
+    __table_args__ = {'info': {'sharded': True}}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_type = db.Column(db.String(30), nullable=False)
+    sender_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    receiver_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sender_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
+    receiver_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), default='RUB')
+    # Сумма зачисления в валюте счета получателя (для переводов с конвертацией)
+    receiver_amount = db.Column(db.Float)
+    exchange_rate = db.Column(db.Float)
+    description = db.Column(db.String(500))
+    status = db.Column(db.String(20), default='completed')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reference_number = db.Column(db.String(50), unique=True)
+    
+    @property
+    def credited_amount(self):
+        return self.receiver_amount if self.receiver_amount is not None else self.amount
+    
+    def generate_reference(self):
+        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        random_str = ''.join(random.choices(string.digits, k=6))
+        return f'TR{timestamp}{random_str}'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'transaction_type': self.transaction_type,
+            'amount': self.amount,
+            'currency': self.currency,
+            'receiver_amount': self.credited_amount,
+            'exchange_rate': self.exchange_rate,
+            'description': self.description,
+            'status': self.status,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'reference_number': self.reference_number
+        }
+
+class MonthlyRollup(db.Model):
+    """Помесячные итоги по счету: входящие и исходящие переводы в валюте счета"""
+    __tablename__ = 'monthly_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'month', name='uq_monthly_rollups_account_month'),
+        {'info': {'sharded': True}}
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # 'YYYY-MM'
+    incoming_count = db.Column(db.Integer, default=0, nullable=False)
+    incoming_amount = db.Column(db.Float, default=0.0, nullable=False)
+    outgoing_count = db.Column(db.Integer, default=0, nullable=False)
+    outgoing_amount = db.Column(db.Float, default=0.0, nullable=False)
+
+class ChangeVersion(db.Model):
+    """Счетчик изменений области данных (например, user:42) для ETag страниц"""
+    __tablename__ = 'change_versions'
+    __table_args__ = {'info': {'sharded': True}}
+    
+    scope = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class AuditLog(db.Model):
+    """Журнал аудита: строки только добавляются (см. audit.py)"""
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_user_created', 'user_id', 'created_at'),
+        db.Index('ix_audit_log_created', 'created_at'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    # Без внешнего ключа: запись аудита переживает пользователя
+    user_id = db.Column(db.Integer)
+    ip_address = db.Column(db.String(45))
+    details = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'action': self.action,
+            'user_id': self.user_id,
+            'ip_address': self.ip_address,
+            'details': json.loads(self.details) if self.details else None
+        }
+
+class OutboxEvent(db.Model):
+    """Событие для асинхронной обработки, пишется в одной транзакции с операцией"""
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        db.Index('ix_outbox_events_pending', 'status', 'available_at'),
+        db.Index('ix_outbox_events_processed', 'status', 'processed_at'),
+        {'info': {'sharded': True}}
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)
+
+class ScheduledTransfer(db.Model):
+    """Плановый (разовый или регулярный) перевод, исполняется воркером scheduler.py"""
+    __tablename__ = 'scheduled_transfers'
+    __table_args__ = {'info': {'sharded': True}}
+    
+    FREQUENCIES = {
+        'once': 'Однократно',
+        'daily': 'Ежедневно',
+        'weekly': 'Еженедельно',
+        'monthly': 'Ежемесячно'
+    }
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    from_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    to_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    description = db.Column(db.String(500))
+    frequency = db.Column(db.String(20), default='once', nullable=False)
+    # Очередной срок по расписанию; повтор после ошибки - в retry_at, срок не сдвигается
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    retry_at = db.Column(db.DateTime)
+    # Пояс клиента: next_run_at хранится в UTC, а показывается в местном времени
+    timezone_name = db.Column(db.String(64))
+    # Первый срок в местном времени: от него берутся час и число месяца следующих сроков
+    local_start_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), default='active', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    runs_count = db.Column(db.Integer, default=0, nullable=False)
+    last_run_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    from_account = db.relationship('Account', foreign_keys=[from_account_id])
+    to_account = db.relationship('Account', foreign_keys=[to_account_id])
+    
+    @property
+    def run_at(self):
+        """Ближайший запуск: повтор после ошибки или очередной срок"""
+        return self.retry_at or self.next_run_at
+    
+    def zone(self):
+        return user_zone(self.timezone_name, 'UTC')
+    
+    def _advance(self):
+        """Переход к следующему сроку; разовый перевод завершается.
+
+        Период отсчитывается в местном времени клиента: перевод в 09:00 остается
+        в 09:00 и после перехода на летнее время, а 1-е число не становится 28-м.
+        """
+        self.attempts = 0
+        self.retry_at = None
+        if self.frequency not in ('daily', 'weekly', 'monthly'):
+            self.status = 'completed'
+            return
+        
+        zone = self.zone()
+        local = utc_to_local(self.next_run_at, zone)
+        anchor = self.local_start_at or local
+        if self.frequency == 'daily':
+            local += timedelta(days=1)
+        elif self.frequency == 'weekly':
+            local += timedelta(weeks=1)
+        else:
+            local = add_months(local, 1, anchor.day)
+        self.next_run_at = local_to_utc(datetime.combine(local.date(), anchor.time()), zone)
+    
+    def record_success(self, now):
+        self.runs_count += 1
+        self.last_run_at = now
+        self.last_error = None
+        self._advance()
+    
+    def record_failure(self, error, now, retry_delay, max_attempts):
+        """Повтор через retry_delay; после max_attempts срок пропускается"""
+        self.attempts += 1
+        self.last_run_at = now
+        self.last_error = error[:500]
+        if self.attempts < max_attempts:
+            self.retry_at = now + retry_delay
+        elif self.frequency == 'once':
+            self.status = 'failed'
+        else:
+            self._advance()
+    
+    def local_next_run_at(self):
+        if not self.timezone_name:
+            return self.run_at
+        return utc_to_local(self.run_at, self.zone())
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'from_account': self.from_account.account_number if self.from_account else None,
+            'to_account': self.to_account.account_number if self.to_account else None,
+            'amount': self.amount,
+            'currency': self.from_account.currency if self.from_account else None,
+            'description': self.description,
+            'frequency': self.frequency,
+            'frequency_label': self.FREQUENCIES.get(self.frequency, self.frequency),
+            'next_run_at': self.local_next_run_at().strftime('%d.%m.%Y %H:%M') if self.next_run_at else None,
+            'status': self.status,
+            'runs_count': self.runs_count,
+            'last_error': self.last_error
+        }
+
+# Очередь воркера: ищет по ближайшему запуску, а не по сроку расписания
+scheduled_run_at = db.func.coalesce(ScheduledTransfer.retry_at, ScheduledTransfer.next_run_at)
+db.Index('ix_scheduled_transfers_run', ScheduledTransfer.status, scheduled_run_at)
+
+# ==================== ГЛОБАЛЬНЫЙ КАТАЛОГ ШАРДОВ ====================
+class UserDirectory(db.Model):
+    """Пользователь -> шард; выдает глобально уникальные id и проверяет уникальность email"""
+    __tablename__ = 'user_directory'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    # Заполняется сразу после выдачи id: шард выбирается по user_id
+    shard = db.Column(db.String(32))
+
+class AccountDirectory(db.Model):
+    """Номер счета -> id, владелец и шард: поиск получателя без обхода шардов"""
+    __tablename__ = 'account_directory'
+    
+    account_id = db.Column(db.Integer, primary_key=True)
+    account_number = db.Column(db.String(20), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    shard = db.Column(db.String(32), nullable=False)
+
+class TransferSaga(db.Model):
+    """Журнал координатора межшардового перевода (см. saga.py)"""
+    __tablename__ = 'transfer_sagas'
+    __table_args__ = (
+        db.Index('ix_transfer_sagas_status', 'status', 'updated_at'),
+    )
+    
+    # started -> debited -> completed | compensated; failed - списание не прошло
+    STATUSES = ('started', 'debited', 'completed', 'compensated', 'failed')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reference = db.Column(db.String(50), unique=True, nullable=False)
+    idempotency_key = db.Column(db.String(100), unique=True)
+    status = db.Column(db.String(20), default='started', nullable=False)
+    from_shard = db.Column(db.String(32), nullable=False)
+    to_shard = db.Column(db.String(32), nullable=False)
+    from_account_id = db.Column(db.Integer, nullable=False)
+    to_account_id = db.Column(db.Integer, nullable=False)
+    from_user_id = db.Column(db.Integer, nullable=False)
+    to_user_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    credited_amount = db.Column(db.Float, nullable=False)
+    receiver_currency = db.Column(db.String(3), nullable=False)
+    exchange_rate = db.Column(db.Float)
+    description = db.Column(db.String(500))
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,180 @@
+"""Транзакционный outbox: события пишутся в той же транзакции БД, что и перевод,
+а диспетчер в фоне раздает их обработчикам.
+
+Доставка "хотя бы один раз": строка помечается обработанной только после
+успешного выполнения всех обработчиков, поэтому при падении воркера событие
+будет доставлено повторно. Обработчики должны быть идемпотентными.
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+_handlers = {}
+
+
+def outbox_handler(event_type):
+    """Декоратор регистрации обработчика: @outbox_handler('transfer.completed')"""
+    def decorator(func):
+        _handlers.setdefault(event_type, []).append(func)
+        return func
+    return decorator
+
+
+def handlers_for(event_type):
+    return list(_handlers.get(event_type, ()))
+
+
+def encode_payload(payload):
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class OutboxMetrics:
+    """Счетчики доставки и отставания диспетчера"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.max_lag_seconds = 0.0
+        self.avg_lag_seconds = 0.0
+
+    def record_batch(self, delivered, retried, dead, lags):
+        self.delivered += delivered
+        self.retried += retried
+        self.dead += dead
+        if lags:
+            self.max_lag_seconds = max(lags)
+            self.avg_lag_seconds = sum(lags) / len(lags)
+
+    @property
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.delivered / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        return (f"[outbox pid={os.getpid()}] доставлено={self.delivered} повторов={self.retried} "
+                f"в dead={self.dead} | {self.throughput:.1f} соб/с | "
+                f"отставание макс={self.max_lag_seconds:.2f} с сред={self.avg_lag_seconds:.2f} с")
+
+
+class OutboxDispatcher:
+    """Разбор очереди outbox пачками.
+
+    Пачка забирается через FOR UPDATE SKIP LOCKED, поэтому несколько
+    диспетчеров не получают одно и то же событие. Неудачное событие
+    откладывается с экспоненциальной задержкой, после max_attempts
+    попыток переходит в статус dead. Доставленные события старше retention
+    раз в purge_seconds удаляются пачками, чтобы таблица не росла без конца.
+    """
+
+    def __init__(self, session, model, batch_size=100, max_attempts=10,
+                 backoff_seconds=2, max_backoff_seconds=600,
+                 retention=None, purge_seconds=3600, purge_batch_size=1000):
+        self.session = session
+        self.model = model
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retention = retention
+        self.purge_seconds = purge_seconds
+        self.purge_batch_size = purge_batch_size
+        self.metrics = OutboxMetrics()
+
+    def backoff(self, attempts):
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds))
+
+    def claim(self, now):
+        model = self.model
+        return self.session.query(model).filter(
+            model.status == 'pending',
+            model.available_at <= now
+        ).order_by(model.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+    def deliver(self, event):
+        payload = json.loads(event.payload)
+        for handler in handlers_for(event.event_type):
+            handler(payload)
+
+    def dispatch_batch(self):
+        """Обработка одной пачки; возвращает количество взятых событий"""
+        now = datetime.utcnow()
+        events = self.claim(now)
+        if not events:
+            self.session.rollback()
+            return 0
+
+        delivered, retried, dead, lags = 0, 0, 0, []
+        for event in events:
+            try:
+                self.deliver(event)
+            except Exception as e:
+                event.attempts += 1
+                event.last_error = f'{type(e).__name__}: {e}'[:500]
+                if event.attempts >= self.max_attempts:
+                    event.status = 'dead'
+                    dead += 1
+                    print(f"❌ Событие outbox #{event.id} ({event.event_type}) перемещено в dead: {e}")
+                else:
+                    event.available_at = now + self.backoff(event.attempts)
+                    retried += 1
+                continue
+
+            event.status = 'done'
+            event.processed_at = datetime.utcnow()
+            lags.append((event.processed_at - event.created_at).total_seconds())
+            delivered += 1
+
+        self.session.commit()
+        self.metrics.record_batch(delivered, retried, dead, lags)
+        return len(events)
+
+    def purge_done(self):
+        """Удаление доставленных событий старше retention; возвращает число удаленных.
+
+        Пачками по purge_batch_size с commit после каждой, чтобы не держать
+        долгую транзакцию и блокировки на большой таблице.
+        """
+        model = self.model
+        cutoff = datetime.utcnow() - self.retention
+        removed = 0
+        while True:
+            ids = [row.id for row in self.session.query(model.id).filter(
+                model.status == 'done',
+                model.processed_at < cutoff
+            ).order_by(model.id).limit(self.purge_batch_size)]
+            if not ids:
+                self.session.rollback()
+                return removed
+            self.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            self.session.commit()
+            removed += len(ids)
+
+    def run_forever(self, poll_seconds=1.0, stop_when_idle=False):
+        last_purge = None
+        while True:
+            if self.retention and (last_purge is None or time.monotonic() - last_purge >= self.purge_seconds):
+                last_purge = time.monotonic()
+                try:
+                    removed = self.purge_done()
+                    if removed:
+                        print(f"🧹 Outbox: удалено {removed} доставленных событий старше {self.retention.days} дн.")
+                except Exception as e:
+                    self.session.rollback()
+                    print(f"❌ Ошибка очистки outbox: {e}")
+
+            try:
+                processed = self.dispatch_batch()
+            except Exception as e:
+                self.session.rollback()
+                print(f"❌ Ошибка диспетчера outbox: {e}")
+                processed = 0
+
+            if processed:
+                print(self.metrics.report())
+            if processed < self.batch_size:
+                if stop_when_idle:
+                    return
+                time.sleep(poll_seconds)
@@ -0,0 +1,62 @@
+"""Диспетчер outbox: раздает события переводов зарегистрированным обработчикам.
+
+Запуск: python outbox_worker.py [--once]
+
+Обработчики регистрируются в services.py через @outbox_handler, поэтому
+воркер импортирует services; обработчики-примеры (только лог) подключаются
+при OUTBOX_EXAMPLE_HANDLERS. Можно запускать несколько экземпляров.
+При шардировании outbox есть в каждом шарде - на каждый шард свой поток.
+Доставленные события старше OUTBOX_RETENTION_DAYS воркер удаляет сам.
+"""
+import argparse
+import threading
+from datetime import timedelta
+
+from app import create_app
+from extensions import db, get_shards
+from models import OutboxEvent
+from outbox import OutboxDispatcher
+import services  # регистрация обработчиков outbox
+
+
+def run_dispatcher(config, stop_when_idle):
+    dispatcher = OutboxDispatcher(
+        db.session,
+        OutboxEvent,
+        batch_size=config['OUTBOX_BATCH_SIZE'],
+        max_attempts=config['OUTBOX_MAX_ATTEMPTS'],
+        backoff_seconds=config['OUTBOX_BACKOFF_SECONDS'],
+        max_backoff_seconds=config['OUTBOX_MAX_BACKOFF_SECONDS'],
+        retention=timedelta(days=config['OUTBOX_RETENTION_DAYS']),
+        purge_seconds=config['OUTBOX_PURGE_SECONDS'],
+        purge_batch_size=config['OUTBOX_PURGE_BATCH_SIZE']
+    )
+    dispatcher.run_forever(config['OUTBOX_POLL_SECONDS'], stop_when_idle=stop_when_idle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Диспетчер событий outbox')
+    parser.add_argument('--once', action='store_true', help='разобрать очередь и выйти')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("📬 Диспетчер outbox запущен")
+        if app.config['OUTBOX_EXAMPLE_HANDLERS']:
+            services.register_example_outbox_handlers()
+        if not app.config['SHARDS']:
+            run_dispatcher(app.config, args.once)
+            return
+
+        router = get_shards()
+        threads = [threading.Thread(target=router.run_on, name=f'outbox-{name}',
+                                    args=(name, run_dispatcher, app.config, args.once))
+                   for name in router.names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Межшардовый перевод: сага с координатором в основной БД.
+
+Каждый шаг - локальная транзакция одного шарда, все шаги идемпотентны по
+номеру операции (reference):
+
+1. started  - в основной БД записан план перевода с уже пересчитанной суммой
+              зачисления;
+2. debited  - в шарде отправителя счет заблокирован, средства списаны,
+              операция записана в статусе pending;
+3. зачисление в шарде получателя (операция completed, событие outbox), затем
+   операция отправителя переводится в completed, сага - в completed.
+
+Если шард получателя отказал (счет закрыт или заблокирован), выполняется
+компенсация: возврат средств, операция отправителя -> reversed, сага ->
+compensated. Статус саги меняется сравнением со старым (UPDATE ... WHERE
+status = ...), поэтому координатор и recover_sagas() не выполнят один шаг
+дважды. recover_sagas() доводит зависшие после сбоя процесса саги до конца.
+"""
+from datetime import datetime, timedelta
+
+from extensions import db, get_fx_rates, get_shards
+from models import Account, Transaction, TransferSaga
+from services import (
+    TRANSACTIONS_SCOPE, TransferError, TransferPending, add_to_rollup, bump_change_versions, check_transfer_limit,
+    enqueue_outbox, user_scope
+)
+from sharding import load_detached
+
+
+def saga_plan(saga):
+    return {column.name: getattr(saga, column.name) for column in TransferSaga.__table__.columns}
+
+# ==================== ШАГИ В ШАРДАХ ====================
+
+def leg_transaction(plan, status):
+    is_conversion = plan['currency'] != plan['receiver_currency']
+    return Transaction(
+        transaction_type='transfer',
+        sender_user_id=plan['from_user_id'],
+        receiver_user_id=plan['to_user_id'],
+        sender_account_id=plan['from_account_id'],
+        receiver_account_id=plan['to_account_id'],
+        amount=plan['amount'],
+        currency=plan['currency'],
+        receiver_amount=plan['credited_amount'] if is_conversion else None,
+        exchange_rate=plan['exchange_rate'] if is_conversion else None,
+        description=plan['description'],
+        status=status,
+        reference_number=plan['reference'],
+        created_at=plan['created_at']
+    )
+
+
+def find_leg(plan):
+    return Transaction.query.filter_by(reference_number=plan['reference']).with_for_update().populate_existing().first()
+
+
+def lock_account(account_id):
+    return Account.query.filter_by(id=account_id).with_for_update().populate_existing().first()
+
+
+def debit(plan):
+    """Шард отправителя: списание и операция в статусе pending"""
+    if find_leg(plan):
+        db.session.rollback()
+        return
+
+    account = lock_account(plan['from_account_id'])
+    if not account:
+        raise TransferError('Счет не найден')
+    if account.status != 'active':
+        raise TransferError('Счет списания заблокирован')
+    if account.balance < plan['amount']:
+        raise TransferError('Недостаточно средств на счете')
+
+    account.balance -= plan['amount']
+    db.session.add(leg_transaction(plan, 'pending'))
+    add_to_rollup(account.id, plan['created_at'].strftime('%Y-%m'),
+                  outgoing_count=1, outgoing_amount=plan['amount'])
+    bump_change_versions(user_scope(plan['from_user_id']))
+    db.session.commit()
+
+
+def credit(plan):
+    """Шард получателя: зачисление, операция completed и событие outbox"""
+    if find_leg(plan):
+        db.session.rollback()
+        return
+
+    account = lock_account(plan['to_account_id'])
+    if not account:
+        raise TransferError('Счет получателя не найден')
+    if account.status != 'active':
+        raise TransferError('Счет получателя заблокирован')
+
+    account.balance += plan['credited_amount']
+    db.session.add(leg_transaction(plan, 'completed'))
+    add_to_rollup(account.id, plan['created_at'].strftime('%Y-%m'),
+                  incoming_count=1, incoming_amount=plan['credited_amount'])
+    bump_change_versions(user_scope(plan['to_user_id']))
+    enqueue_outbox('transfer.completed', {
+        'reference': plan['reference'],
+        'sender_user_id': plan['from_user_id'],
+        'receiver_user_id': plan['to_user_id'],
+        'sender_account_id': plan['from_account_id'],
+        'receiver_account_id': plan['to_account_id'],
+        'amount': plan['amount'],
+        'currency': plan['currency'],
+        'credited_amount': plan['credited_amount'],
+        'receiver_currency': plan['receiver_currency']
+    })
+    db.session.commit()
+
+
+def finish(plan):
+    """Шард отправителя: операция pending -> completed"""
+    transaction = find_leg(plan)
+    if transaction and transaction.status == 'pending':
+        transaction.status = 'completed'
+        bump_change_versions(user_scope(plan['from_user_id']), TRANSACTIONS_SCOPE)
+    db.session.commit()
+
+
+def compensate(plan):
+    """Шард отправителя: возврат списанного; без списания ничего не делает"""
+    transaction = find_leg(plan)
+    if not transaction or transaction.status != 'pending':
+        db.session.rollback()
+        return
+
+    account = lock_account(plan['from_account_id'])
+    account.balance += plan['amount']
+    transaction.status = 'reversed'
+    add_to_rollup(account.id, plan['created_at'].strftime('%Y-%m'),
+                  outgoing_count=-1, outgoing_amount=-plan['amount'])
+    bump_change_versions(user_scope(plan['from_user_id']), TRANSACTIONS_SCOPE)
+    db.session.commit()
+
+
+def load_sender_leg(plan):
+    transaction = Transaction.query.filter_by(reference_number=plan['reference']).first()
+    db.session.expunge(transaction)
+    return transaction, load_detached(Account, plan['from_account_id'])
+
+# ==================== КООРДИНАТОР (ОСНОВНАЯ БД) ====================
+
+def create_saga(plan, idempotency_key):
+    saga = TransferSaga(idempotency_key=idempotency_key, **plan)
+    db.session.add(saga)
+    db.session.commit()
+    return saga_plan(saga)
+
+
+def saga_by_key(idempotency_key):
+    saga = TransferSaga.query.filter_by(idempotency_key=idempotency_key).first()
+    return saga_plan(saga) if saga else None
+
+
+def change_status(saga_id, expected, status, error=None):
+    """Смена статуса, только если сага все еще в expected; возвращает успех"""
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if error:
+        values['last_error'] = error[:500]
+    updated = TransferSaga.query.filter_by(id=saga_id, status=expected).update(values)
+    db.session.commit()
+    return updated == 1
+
+
+def current_status(saga_id):
+    return db.session.query(TransferSaga.status, TransferSaga.last_error).filter_by(id=saga_id).one()
+
+
+def advance(plan, status, error=None):
+    router = get_shards()
+    if not router.run_on(None, change_status, plan['id'], plan['status'], status, error):
+        return False
+    plan['status'] = status
+    if error:
+        plan['last_error'] = error
+    return True
+
+
+def drive(plan):
+    """Выполнение саги с ее текущего шага до конечного статуса.
+
+    Сбой не бизнес-проверки (БД, сеть) посреди саги - TransferPending: списание
+    могло пройти, и сагу доведет recover_sagas(), так что ошибкой это не считаем.
+    """
+    try:
+        return run_steps(plan)
+    except TransferError:
+        raise
+    except Exception as e:
+        if plan['status'] in ('started', 'debited'):
+            raise TransferPending(plan['reference']) from e
+        raise
+
+
+def run_steps(plan):
+    router = get_shards()
+
+    if plan['status'] == 'started':
+        try:
+            router.run_on(plan['from_shard'], debit, plan)
+        except TransferError as e:
+            advance(plan, 'failed', str(e))
+            raise
+        if not advance(plan, 'debited'):
+            # Сагу уже закрыл recover_sagas() - наше списание возвращаем
+            router.run_on(plan['from_shard'], compensate, plan)
+            raise TransferError('Перевод прерван, средства возвращены')
+
+    if plan['status'] == 'debited':
+        try:
+            router.run_on(plan['to_shard'], credit, plan)
+        except TransferError as e:
+            router.run_on(plan['from_shard'], compensate, plan)
+            advance(plan, 'compensated', str(e))
+            raise
+        router.run_on(plan['from_shard'], finish, plan)
+        if not advance(plan, 'completed'):
+            plan['status'], plan['last_error'] = router.run_on(None, current_status, plan['id'])
+
+    if plan['status'] != 'completed':
+        raise TransferError(plan['last_error'] or 'Перевод не выполнен')
+
+    transaction, from_account = router.run_on(plan['from_shard'], load_sender_leg, plan)
+    to_account = router.run_on(plan['to_shard'], load_detached, Account, plan['to_account_id'])
+    return transaction, from_account, to_account
+
+
+def transfer_across_shards(from_account, to_account, from_shard, to_shard, amount,
+                           description=None, idempotency_key=None):
+    """Перевод между счетами разных шардов.
+
+    Возвращает (операция отправителя, счет отправителя, счет получателя) -
+    объекты отсоединены от сессий. Повтор с тем же idempotency_key не
+    выполняет перевод второй раз, а возвращает результат первого.
+    """
+    router = get_shards()
+    if idempotency_key:
+        existing = router.run_on(None, saga_by_key, idempotency_key)
+        if existing:
+            return drive(existing)
+
+    if amount <= 0:
+        raise TransferError('Сумма должна быть больше 0')
+    if to_account.status != 'active':
+        raise TransferError('Счет получателя заблокирован')
+    check_transfer_limit(amount, from_account.currency)
+    try:
+        credited_amount, rate = get_fx_rates().convert(amount, from_account.currency, to_account.currency)
+    except ValueError as e:
+        raise TransferError(str(e))
+
+    plan = {
+        'reference': Transaction().generate_reference(),
+        'status': 'started',
+        'from_shard': from_shard,
+        'to_shard': to_shard,
+        'from_account_id': from_account.id,
+        'to_account_id': to_account.id,
+        'from_user_id': from_account.user_id,
+        'to_user_id': to_account.user_id,
+        'amount': amount,
+        'currency': from_account.currency,
+        'credited_amount': credited_amount,
+        'receiver_currency': to_account.currency,
+        'exchange_rate': rate,
+        'description': description or f'Перевод со счета {from_account.account_number}',
+        'created_at': datetime.utcnow()
+    }
+    plan['updated_at'] = plan['created_at']
+    return drive(router.run_on(None, create_saga, plan, idempotency_key))
+
+
+def stale_sagas(older_than):
+    return [saga_plan(saga) for saga in TransferSaga.query.filter(
+        TransferSaga.status.in_(['started', 'debited']),
+        TransferSaga.updated_at < older_than
+    ).order_by(TransferSaga.id).limit(1000)]
+
+
+def recover_sagas(older_than_seconds=60):
+    """Завершение саг, зависших после сбоя; возвращает число обработанных"""
+    router = get_shards()
+    stale = router.run_on(None, stale_sagas, datetime.utcnow() - timedelta(seconds=older_than_seconds))
+
+    for plan in stale:
+        try:
+            if plan['status'] == 'started':
+                # Сначала закрываем сагу: если координатор успел перевести ее в debited,
+                # он ее и доведет. Списание возвращаем, только выиграв смену статуса
+                if advance(plan, 'failed', 'Прервано сбоем до списания'):
+                    router.run_on(plan['from_shard'], compensate, plan)
+            else:
+                drive(plan)
+            print(f"✅ Сага {plan['reference']}: {plan['status']}")
+        except TransferError as e:
+            print(f"⚠️ Сага {plan['reference']}: {plan['status']} ({e})")
+        except Exception as e:
+            print(f"❌ Сага {plan['reference']} не восстановлена: {e}")
+    return len(stale)
@@ -0,0 +1,206 @@
+"""Воркер плановых переводов.
+
+Запуск: python scheduler.py [--batch-size 100] [--poll 5] [--once]
+
+Можно запускать несколько процессов одновременно: каждый забирает пачку
+просроченных переводов через SELECT ... FOR UPDATE SKIP LOCKED, поэтому строку,
+уже взятую другим воркером, он просто пропускает. Исполнение перевода и сдвиг
+next_run_at фиксируются одним commit, так что повторного списания не бывает.
+
+При шардировании пачки забираются в каждом шарде по очереди. Перевод на счет
+другого шарда выполняется сагой после commit пачки; ключ идемпотентности
+(id и время запуска - срок или повтор после ошибки) не дает выполнить его
+дважды, даже если строку успеет забрать другой воркер, а результат записывает
+только тот, кто застал строку еще на этом запуске. Заодно воркер завершает зависшие саги.
+
+События для живого обновления кабинета доходят до веб-процессов только через
+EVENTS_BACKEND=redis: с бэкендом memory они остаются в памяти воркера.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import create_app
+from extensions import db, get_shards
+from models import Account, ScheduledTransfer, scheduled_run_at
+from saga import recover_sagas, transfer_across_shards
+from services import apply_transfer, publish_transfer_events, TransferError, TransferPending
+from sharding import current_shard, load_detached, shard_of_account, sharding_enabled
+
+
+class SchedulerMetrics:
+    """Счетчики пропускной способности и отставания воркера"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.batches = 0
+        self.executed = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.avg_lag_seconds = 0.0
+
+    def record_batch(self, executed, failed, lags, elapsed):
+        self.batches += 1
+        self.executed += executed
+        self.failed += failed
+        self.last_batch_size = executed + failed
+        self.last_batch_seconds = elapsed
+        if lags:
+            self.max_lag_seconds = max(lags)
+            self.avg_lag_seconds = sum(lags) / len(lags)
+
+    @property
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.executed / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        return (f"[scheduler pid={os.getpid()}] пачка={self.last_batch_size} "
+                f"за {self.last_batch_seconds * 1000:.0f} мс | всего выполнено={self.executed} "
+                f"ошибок={self.failed} | {self.throughput:.1f} пер/с | "
+                f"отставание макс={self.max_lag_seconds:.1f} с сред={self.avg_lag_seconds:.1f} с")
+
+
+def claim_due(batch_size, now):
+    """Пачка просроченных переводов, заблокированных за этим воркером"""
+    return ScheduledTransfer.query.filter(
+        ScheduledTransfer.status == 'active',
+        scheduled_run_at <= now
+    ).order_by(scheduled_run_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+
+def transfer_to_shard(scheduled_id, from_account_id, to_account_id, amount, description, run_at):
+    """Плановый перевод на счет другого шарда (сага фиксирует шаги сама)"""
+    from_account = load_detached(Account, from_account_id)
+    to_shard = shard_of_account(to_account_id)
+    to_account = get_shards().run_on(to_shard, load_detached, Account, to_account_id)
+    if not from_account or not to_account:
+        raise TransferError('Счет не найден')
+    return transfer_across_shards(
+        from_account, to_account, current_shard(), to_shard, amount, description,
+        idempotency_key=f'scheduled:{scheduled_id}:{run_at.isoformat()}'
+    )
+
+
+def run_batch(batch_size, metrics):
+    """Исполнение одной пачки; возвращает количество обработанных переводов"""
+    started = time.monotonic()
+    now = datetime.utcnow()
+    retry_delay = timedelta(minutes=current_app.config['SCHEDULER_RETRY_MINUTES'])
+    max_attempts = current_app.config['SCHEDULER_MAX_ATTEMPTS']
+
+    due = claim_due(batch_size, now)
+    if not due:
+        db.session.rollback()
+        return 0
+
+    executed, failed, lags, completed, remote = 0, 0, [], [], []
+    for scheduled in due:
+        lags.append((now - scheduled.run_at).total_seconds())
+        if sharding_enabled() and scheduled.to_account is None:
+            remote.append((scheduled.id, scheduled.from_account_id, scheduled.to_account_id,
+                           scheduled.amount, scheduled.description or 'Плановый перевод',
+                           scheduled.run_at))
+            continue
+        try:
+            # Savepoint: неудачный перевод откатывается, не затрагивая остальную пачку
+            with db.session.begin_nested():
+                completed.append(apply_transfer(
+                    scheduled.from_account_id,
+                    scheduled.to_account_id,
+                    scheduled.amount,
+                    scheduled.description or 'Плановый перевод'
+                ))
+            scheduled.record_success(now)
+            executed += 1
+        except TransferError as e:
+            scheduled.record_failure(str(e), now, retry_delay, max_attempts)
+            failed += 1
+
+    db.session.commit()
+
+    for scheduled_id, *transfer in remote:
+        run_at = transfer[-1]
+        try:
+            result, error = transfer_to_shard(scheduled_id, *transfer), None
+        except TransferPending as e:
+            # Строка остается на этом запуске: следующая пачка продолжит ту же сагу по ключу
+            print(f"⏳ Плановый перевод {scheduled_id}: {e}")
+            continue
+        except TransferError as e:
+            result, error = None, str(e)
+        scheduled = ScheduledTransfer.query.filter_by(id=scheduled_id).with_for_update().populate_existing().one()
+        if scheduled.status != 'active' or scheduled.run_at != run_at:
+            # После commit пачки строку успел забрать другой воркер и уже записал
+            # результат этого срока (перевод сага по ключу дважды не выполнила)
+            db.session.rollback()
+            continue
+        if error is None:
+            scheduled.record_success(now)
+            completed.append(result)
+            executed += 1
+        else:
+            scheduled.record_failure(error, now, retry_delay, max_attempts)
+            failed += 1
+        db.session.commit()
+
+    for transaction, from_account, to_account in completed:
+        publish_transfer_events(transaction, from_account, to_account)
+
+    metrics.record_batch(executed, failed, lags, time.monotonic() - started)
+    print(metrics.report())
+    return len(due)
+
+
+def run_shard_batches(batch_size, metrics):
+    """Пачка в каждом шарде; возвращает наибольшую, чтобы не ждать, пока хоть один шард отстает"""
+    if not sharding_enabled():
+        return run_batch(batch_size, metrics)
+    router = get_shards()
+    return max(router.run_on(name, run_batch, batch_size, metrics) for name in router.names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воркер плановых переводов')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--poll', type=float, default=None, help='пауза между опросами, сек')
+    parser.add_argument('--once', action='store_true', help='обработать все просроченные и выйти')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        batch_size = args.batch_size or app.config['SCHEDULER_BATCH_SIZE']
+        poll_seconds = args.poll or app.config['SCHEDULER_POLL_SECONDS']
+        metrics = SchedulerMetrics()
+        recovery_seconds = app.config['SHARD_SAGA_RECOVERY_SECONDS']
+        last_recovery = 0.0
+
+        print(f"⏰ Воркер плановых переводов запущен (pid={os.getpid()}, пачка={batch_size})")
+        if app.config['EVENTS_BACKEND'] == 'memory':
+            print("⚠️ EVENTS_BACKEND=memory: кабинеты не увидят плановые переводы без перезагрузки, "
+                  "задайте EVENTS_BACKEND=redis")
+        while True:
+            try:
+                processed = run_shard_batches(batch_size, metrics)
+                if sharding_enabled() and time.monotonic() - last_recovery >= recovery_seconds:
+                    recover_sagas(recovery_seconds)
+                    last_recovery = time.monotonic()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Ошибка обработки пачки: {e}")
+                processed = 0
+
+            # Полная пачка - вероятно, есть еще просроченные, забираем сразу
+            if processed < batch_size:
+                if args.once:
+                    break
+                time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,856 @@
+"""Бизнес-логика банка: переводы, балансы, итоги, валидация и инициализация БД"""
+import random
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, has_request_context, request, session
+from sqlalchemy import text, case, inspect, literal, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db, get_audit, get_broker, get_fx_rates, get_velocity
+from models import (
+    User, Account, Transaction, MonthlyRollup, OutboxEvent, ChangeVersion, AuditLog, AccountDirectory
+)
+from outbox import outbox_handler, encode_payload
+from sharding import (
+    create_shard_schema, fan_out, find_user_by_email, global_tables, on_user_shard, place_new_user,
+    register_account, sharding_enabled
+)
+
+velocity_warm_lock = threading.Lock()
+# (отпечаток снимка курсов, валюта) без курса, о которых уже предупредили
+missing_rate_warnings = set()
+
+# ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
+def generate_account_number(user_id, account_type='current'):
+    """Генерация номера счета (ровно 20 символов)"""
+    prefix = {
+        'current': '40817',
+        'savings': '42301',
+        'credit': '45201'
+    }.get(account_type, '40817')
+    
+    # Формат: префикс (5) + 810 + user_id (10 цифр) = 18 символов
+    # Добавим 2 случайные цифры для уникальности = 20 символов
+    user_part = f"{user_id:010d}"  # 10 цифр с ведущими нулями
+    random_part = ''.join(random.choices('0123456789', k=2))
+    
+    return f'{prefix}810{user_part}{random_part}'  # 5 + 3 + 10 + 2 = 20 символов
+
+CURRENCY_SYMBOLS = {'RUB': '₽', 'USD': '$', 'EUR': '€', 'CNY': '¥', 'KZT': '₸'}
+
+def currency_symbol(code):
+    return CURRENCY_SYMBOLS.get(code, code)
+
+def check_transfer_limit(amount, currency):
+    """Лимит одного перевода задан в базовой валюте - сумму в валюте счета пересчитываем"""
+    snapshot = get_fx_rates().snapshot()
+    try:
+        amount_base, _ = snapshot.convert(amount, currency, snapshot.base)
+    except ValueError as e:
+        raise TransferError(str(e))
+    limit = current_app.config['TRANSFER_MAX_AMOUNT']
+    if amount_base > limit:
+        raise TransferError(f'Максимальная сумма перевода: {limit:,.0f} {currency_symbol(snapshot.base)}')
+
+def rate_expr(snapshot):
+    """SQL-выражение курса валюты счета к базовой по текущему снимку курсов"""
+    return case(dict(snapshot.rates), value=Account.currency, else_=None)
+
+def converted_balance_expr(snapshot):
+    """SQL-выражение баланса в базовой валюте"""
+    return Account.balance * rate_expr(snapshot)
+
+def balance_totals(*criteria):
+    """Балансы по валютам и итог в базовой валюте одним GROUP BY запросом"""
+    snapshot = get_fx_rates().snapshot()
+    rows = db.session.query(
+        Account.currency,
+        db.func.count(Account.id),
+        db.func.sum(Account.balance),
+        db.func.sum(converted_balance_expr(snapshot))
+    ).filter(*criteria).group_by(Account.currency).order_by(Account.currency).all()
+    
+    by_currency = []
+    total = 0.0
+    for currency, count, balance, converted in rows:
+        by_currency.append({
+            'currency': currency,
+            'accounts': count,
+            'balance': balance or 0.0,
+            'converted': converted
+        })
+        if converted is None:
+            # Один раз на снимок курсов, а не на каждый запрос кабинета
+            key = (snapshot.fingerprint, currency)
+            if key not in missing_rate_warnings:
+                missing_rate_warnings.add(key)
+                print(f"⚠️ Нет курса для валюты {currency}, счета не учтены в итоге")
+        else:
+            total += converted
+    
+    return {'base': snapshot.base, 'total': total, 'by_currency': by_currency}
+
+def merge_balance_totals(parts):
+    """Сложение результатов balance_totals() разных шардов"""
+    by_currency = {}
+    for part in parts:
+        for row in part['by_currency']:
+            merged = by_currency.setdefault(row['currency'], {
+                'currency': row['currency'], 'accounts': 0, 'balance': 0.0, 'converted': 0.0
+            })
+            merged['accounts'] += row['accounts']
+            merged['balance'] += row['balance']
+            if row['converted'] is None or merged['converted'] is None:
+                merged['converted'] = None
+            else:
+                merged['converted'] += row['converted']
+    
+    return {
+        'base': parts[0]['base'],
+        'total': sum(part['total'] for part in parts),
+        'by_currency': [by_currency[currency] for currency in sorted(by_currency)]
+    }
+
+def latest_transactions(limit):
+    return Transaction.query.order_by(Transaction.created_at.desc()).limit(limit).all()
+
+def merge_latest_transactions(parts, limit):
+    """Слияние последних операций шардов: межшардовый перевод записан в обоих, берем один раз"""
+    merged = {}
+    for trans in sorted((trans for part in parts for trans in part), key=lambda t: t.created_at, reverse=True):
+        merged.setdefault(trans.reference_number or id(trans), trans)
+    return list(merged.values())[:limit]
+
+def account_numbers(account_ids):
+    """Номера счетов по id одним запросом; счета других шардов - из глобального каталога"""
+    ids = {account_id for account_id in account_ids if account_id is not None}
+    if not ids:
+        return {}
+    numbers = dict(db.session.query(Account.id, Account.account_number).filter(Account.id.in_(ids)))
+    missing = ids - numbers.keys()
+    if missing and sharding_enabled():
+        numbers.update(db.session.query(AccountDirectory.account_id, AccountDirectory.account_number).filter(
+            AccountDirectory.account_id.in_(missing)
+        ))
+    return numbers
+
+def publish_transfer_events(transaction, from_account, to_account):
+    """Отправка SSE-событий отправителю и получателю после фиксации перевода"""
+    for account, is_sender in ((from_account, True), (to_account, False)):
+        # Итог считается в шарде владельца счета: получатель может быть в другом шарде
+        totals = on_user_shard(account.user_id, balance_totals,
+                               Account.user_id == account.user_id, Account.status == 'active')
+        get_broker().publish(account.user_id, 'balance', {
+            'account_id': account.id,
+            'account_number': account.account_number,
+            'balance': account.balance,
+            'currency': account.currency,
+            'total_balance': totals['total'],
+            'base_currency': totals['base']
+        })
+        get_broker().publish(account.user_id, 'transaction', {
+            'date': transaction.created_at.strftime('%d.%m.%Y %H:%M'),
+            'description': transaction.description or 'Без описания',
+            'amount': -transaction.amount if is_sender else transaction.credited_amount,
+            'currency': transaction.currency if is_sender else to_account.currency,
+            'type': 'outgoing' if is_sender else 'incoming',
+            'reference': transaction.reference_number
+        })
+
+# ==================== ПОМЕСЯЧНЫЕ ИТОГИ ====================
+ROLLUP_COUNTERS = ('incoming_count', 'incoming_amount', 'outgoing_count', 'outgoing_amount')
+
+def dialect_insert():
+    """insert с поддержкой ON CONFLICT для текущей СУБД (или None)"""
+    return {
+        'postgresql': postgresql.insert,
+        'sqlite': sqlite.insert
+    }.get(db.engine.dialect.name)
+
+def month_expr(column):
+    """SQL-выражение 'YYYY-MM' для даты"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.to_char(column, 'YYYY-MM')
+    return db.func.strftime('%Y-%m', column)
+
+def add_to_rollup(account_id, month, **deltas):
+    """Атомарное приращение помесячных итогов счета (upsert в текущей транзакции)"""
+    values = {name: deltas.get(name, 0) for name in ROLLUP_COUNTERS}
+    insert = dialect_insert()
+    
+    if insert is not None:
+        stmt = insert(MonthlyRollup).values(account_id=account_id, month=month, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['account_id', 'month'],
+            set_={name: getattr(MonthlyRollup, name) + getattr(stmt.excluded, name)
+                  for name in ROLLUP_COUNTERS}
+        )
+        db.session.execute(stmt)
+        return
+    
+    rollup = MonthlyRollup.query.filter_by(account_id=account_id, month=month).with_for_update().first()
+    if not rollup:
+        rollup = MonthlyRollup(account_id=account_id, month=month, **{name: 0 for name in ROLLUP_COUNTERS})
+        db.session.add(rollup)
+    for name, delta in values.items():
+        setattr(rollup, name, getattr(rollup, name) + delta)
+
+def rebuild_monthly_rollups():
+    """Полный пересчет итогов из transactions одним INSERT ... SELECT"""
+    month = month_expr(Transaction.created_at)
+    completed = Transaction.status == 'completed'
+    incoming_local = outgoing_local = literal(True)
+    if sharding_enabled():
+        # Операция межшардового перевода есть в обоих шардах, итоги - только по своим счетам
+        local_ids = db.select(Account.id)
+        incoming_local = Transaction.receiver_account_id.in_(local_ids)
+        outgoing_local = Transaction.sender_account_id.in_(local_ids)
+    
+    incoming = db.select(
+        Transaction.receiver_account_id.label('account_id'),
+        month.label('month'),
+        literal(1).label('incoming_count'),
+        db.func.coalesce(Transaction.receiver_amount, Transaction.amount).label('incoming_amount'),
+        literal(0).label('outgoing_count'),
+        literal(0.0).label('outgoing_amount')
+    ).where(completed, incoming_local)
+    
+    outgoing = db.select(
+        Transaction.sender_account_id,
+        month,
+        literal(0),
+        literal(0.0),
+        literal(1),
+        Transaction.amount
+    ).where(completed, Transaction.sender_account_id.isnot(None), outgoing_local)
+    
+    legs = union_all(incoming, outgoing).subquery()
+    grouped = db.select(
+        legs.c.account_id,
+        legs.c.month,
+        *[db.func.sum(legs.c[name]) for name in ROLLUP_COUNTERS]
+    ).group_by(legs.c.account_id, legs.c.month)
+    
+    db.session.execute(db.delete(MonthlyRollup))
+    db.session.execute(db.insert(MonthlyRollup).from_select(
+        ['account_id', 'month', *ROLLUP_COUNTERS], grouped
+    ))
+    db.session.commit()
+    return MonthlyRollup.query.count()
+
+def monthly_totals(account_ids, months=None):
+    """Итоги по месяцам для набора счетов в базовой валюте, новые месяцы первыми"""
+    snapshot = get_fx_rates().snapshot()
+    rate = rate_expr(snapshot)
+    query = db.session.query(
+        MonthlyRollup.month,
+        db.func.sum(MonthlyRollup.incoming_count),
+        db.func.sum(MonthlyRollup.incoming_amount * rate),
+        db.func.sum(MonthlyRollup.outgoing_count),
+        db.func.sum(MonthlyRollup.outgoing_amount * rate)
+    ).join(Account, Account.id == MonthlyRollup.account_id).filter(
+        MonthlyRollup.account_id.in_(account_ids)
+    ).group_by(MonthlyRollup.month).order_by(MonthlyRollup.month.desc())
+    
+    if months:
+        query = query.limit(months)
+    
+    return [{
+        'month': month,
+        'incoming_count': incoming_count or 0,
+        'incoming_amount': round(incoming_amount or 0.0, 2),
+        'outgoing_count': outgoing_count or 0,
+        'outgoing_amount': round(outgoing_amount or 0.0, 2)
+    } for month, incoming_count, incoming_amount, outgoing_count, outgoing_amount in query.all()]
+
+def internal_transfer_totals(account_ids):
+    """Выполненные переводы между счетами набора: в итогах они учтены и как исходящие,
+    и как входящие. Возвращает (количество, зачисленная сумма в базовой валюте)"""
+    snapshot = get_fx_rates().snapshot()
+    credited = db.func.coalesce(Transaction.receiver_amount, Transaction.amount)
+    count, amount = db.session.query(
+        db.func.count(Transaction.id),
+        db.func.sum(credited * rate_expr(snapshot))
+    ).join(Account, Account.id == Transaction.receiver_account_id).filter(
+        Transaction.sender_account_id.in_(account_ids),
+        Transaction.receiver_account_id.in_(account_ids),
+        Transaction.status == 'completed'
+    ).one()
+    return count or 0, amount or 0.0
+
+# ==================== ВЕРСИИ ИЗМЕНЕНИЙ (HTTP-КЭШ) ====================
+# Меняется при обновлении уже записанных операций (новые видны по последнему id)
+TRANSACTIONS_SCOPE = 'transactions'
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+def bump_change_versions(*scopes):
+    """Увеличение версий областей данных в текущей транзакции"""
+    now = datetime.utcnow()
+    insert = dialect_insert()
+    
+    # Строки блокируются в одном порядке, чтобы встречные переводы не получали deadlock
+    for scope in sorted(set(scopes)):
+        if insert is not None:
+            stmt = insert(ChangeVersion).values(scope=scope, version=1, updated_at=now)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['scope'],
+                set_={'version': ChangeVersion.version + 1, 'updated_at': now}
+            ))
+            continue
+        
+        row = ChangeVersion.query.filter_by(scope=scope).with_for_update().first()
+        if not row:
+            row = ChangeVersion(scope=scope, version=0)
+            db.session.add(row)
+        row.version += 1
+        row.updated_at = now
+
+def user_page_state():
+    """Версия страниц текущего пользователя для conditional(): его данные и курсы валют"""
+    if 'user_id' not in session:
+        return None
+    
+    row = db.session.query(ChangeVersion.version, ChangeVersion.updated_at).filter_by(
+        scope=user_scope(session['user_id'])
+    ).first()
+    version, updated_at = row or (0, None)
+    
+    snapshot = get_fx_rates().snapshot()
+    rates_at = datetime.fromtimestamp(snapshot.loaded_at, timezone.utc).replace(tzinfo=None)
+    return f'{version}:{snapshot.fingerprint}', max(updated_at or rates_at, rates_at)
+
+def last_transaction():
+    last = db.session.query(Transaction.id, Transaction.created_at).order_by(Transaction.id.desc()).first()
+    changed = db.session.query(ChangeVersion.version, ChangeVersion.updated_at).filter_by(
+        scope=TRANSACTIONS_SCOPE
+    ).first()
+    last_id, created_at = last or (0, None)
+    version, updated_at = changed or (0, None)
+    moments = [moment for moment in (created_at, updated_at) if moment]
+    return f'{last_id}.{version}', max(moments) if moments else None
+
+def transactions_state():
+    """Версия таблицы transactions: последний id (новые операции) и версия области
+    transactions, которую увеличивает каждое изменение статуса уже записанной
+    операции (сага: pending -> completed/reversed). При шардировании - по всем шардам"""
+    states = fan_out(last_transaction)
+    moments = [moment for _, moment in states if moment]
+    return ':'.join(version for version, _ in states), max(moments) if moments else None
+
+# ==================== ПЕРЕВОДЫ ====================
+def enqueue_outbox(event_type, payload):
+    """Добавление события в outbox; фиксируется вместе с текущей транзакцией"""
+    db.session.add(OutboxEvent(event_type=event_type, payload=encode_payload(payload)))
+
+class TransferError(Exception):
+    """Перевод отклонен бизнес-проверкой (нет средств, счет заблокирован и т.п.)"""
+
+class TransferPending(Exception):
+    """Шаг межшардового перевода прерван сбоем: исход узнаем, когда сагу доведет recover_sagas()"""
+    
+    def __init__(self, reference):
+        super().__init__(f'Перевод {reference} в обработке')
+        self.reference = reference
+
+def apply_transfer(from_account_id, to_account_id, amount, description=None):
+    """Списание, зачисление и запись операции в текущей транзакции БД.
+    
+    Строки обоих счетов блокируются (SELECT ... FOR UPDATE) в порядке id, чтобы
+    встречные переводы не получали deadlock, а баланс проверяется уже под
+    блокировкой. commit и публикацию событий выполняет вызывающий код.
+    """
+    locked = Account.query.filter(
+        Account.id.in_([from_account_id, to_account_id])
+    ).order_by(Account.id).with_for_update().populate_existing().all()
+    accounts = {acc.id: acc for acc in locked}
+    
+    from_account = accounts.get(from_account_id)
+    to_account = accounts.get(to_account_id)
+    
+    if not from_account or not to_account:
+        raise TransferError('Счет не найден')
+    if from_account.id == to_account.id:
+        raise TransferError('Нельзя переводить на тот же счет')
+    if from_account.status != 'active':
+        raise TransferError('Счет списания заблокирован')
+    if to_account.status != 'active':
+        raise TransferError('Счет получателя заблокирован')
+    if amount <= 0:
+        raise TransferError('Сумма должна быть больше 0')
+    check_transfer_limit(amount, from_account.currency)
+    if from_account.balance < amount:
+        raise TransferError('Недостаточно средств на счете')
+    
+    try:
+        credited_amount, rate = get_fx_rates().convert(amount, from_account.currency, to_account.currency)
+    except ValueError as e:
+        raise TransferError(str(e))
+    is_conversion = from_account.currency != to_account.currency
+    
+    transaction = Transaction(
+        transaction_type='transfer',
+        sender_user_id=from_account.user_id,
+        receiver_user_id=to_account.user_id,
+        sender_account_id=from_account.id,
+        receiver_account_id=to_account.id,
+        amount=amount,
+        currency=from_account.currency,
+        receiver_amount=credited_amount if is_conversion else None,
+        exchange_rate=rate if is_conversion else None,
+        description=description or f'Перевод со счета {from_account.account_number}',
+        status='completed'
+    )
+    transaction.reference_number = transaction.generate_reference()
+    transaction.created_at = datetime.utcnow()
+    
+    from_account.balance -= amount
+    to_account.balance += credited_amount
+    
+    db.session.add(transaction)
+    
+    month = transaction.created_at.strftime('%Y-%m')
+    add_to_rollup(from_account.id, month, outgoing_count=1, outgoing_amount=amount)
+    add_to_rollup(to_account.id, month, incoming_count=1, incoming_amount=credited_amount)
+    bump_change_versions(user_scope(from_account.user_id), user_scope(to_account.user_id))
+    
+    enqueue_outbox('transfer.completed', {
+        'reference': transaction.reference_number,
+        'sender_user_id': from_account.user_id,
+        'receiver_user_id': to_account.user_id,
+        'sender_account_id': from_account.id,
+        'receiver_account_id': to_account.id,
+        'amount': amount,
+        'currency': from_account.currency,
+        'credited_amount': credited_amount,
+        'receiver_currency': to_account.currency
+    })
+    return transaction, from_account, to_account
+
+def utc_timestamp(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+def velocity_history(window_start, history_start):
+    recent = db.session.query(
+        Transaction.reference_number,
+        Transaction.sender_account_id,
+        Transaction.receiver_account_id,
+        Transaction.amount,
+        Transaction.currency,
+        Transaction.created_at
+    ).filter(
+        Transaction.sender_account_id.isnot(None),
+        Transaction.created_at >= window_start
+    ).order_by(Transaction.created_at)
+    
+    known_pairs = db.session.query(
+        Transaction.sender_account_id,
+        Transaction.receiver_account_id
+    ).filter(
+        Transaction.sender_account_id.isnot(None),
+        Transaction.created_at >= history_start
+    ).distinct()
+    
+    return {reference: tuple(row) for reference, *row in recent}, [tuple(pair) for pair in known_pairs]
+
+def warm_velocity():
+    """Загрузка окон velocity из недавних транзакций при первой проверке в процессе"""
+    with velocity_warm_lock:
+        velocity = get_velocity()
+        if velocity.warmed:
+            return
+        
+        now = datetime.utcnow()
+        snapshot = get_fx_rates().snapshot()
+        window_start = now - timedelta(seconds=current_app.config['VELOCITY_WINDOW_SECONDS'])
+        history_start = now - timedelta(days=current_app.config['VELOCITY_RECIPIENT_HISTORY_DAYS'])
+        
+        # Межшардовый перевод записан в обоих шардах - одинаковые операции схлопываются по номеру
+        recent = {}
+        known_pairs = set()
+        for shard_recent, shard_pairs in fan_out(velocity_history, window_start, history_start):
+            recent.update(shard_recent)
+            known_pairs.update(shard_pairs)
+        
+        transfers = []
+        for sender_id, receiver_id, amount, currency, created_at in recent.values():
+            try:
+                amount_base, _ = snapshot.convert(amount, currency or snapshot.base, snapshot.base)
+            except ValueError:
+                amount_base = amount
+            transfers.append((sender_id, receiver_id, amount_base, utc_timestamp(created_at)))
+        
+        # Окна заполняются от старых переводов к новым (шарды сливаются по времени)
+        transfers.sort(key=lambda transfer: transfer[3])
+        velocity.warm_start(transfers, known_pairs)
+        print(f"✅ Velocity: загружено {len(transfers)} переводов, {len(known_pairs)} пар получателей")
+
+def check_velocity(from_account, to_account, amount):
+    """Проверка лимитов частоты до исполнения перевода (микросекунды, без запросов к БД)"""
+    if not current_app.config['VELOCITY_ENABLED']:
+        return None
+    velocity = get_velocity()
+    if not velocity.warmed:
+        warm_velocity()
+    snapshot = get_fx_rates().snapshot()
+    amount_base, _ = snapshot.convert(amount, from_account.currency, snapshot.base)
+    return velocity.check(from_account.id, to_account.id, amount_base)
+
+def record_velocity(transaction):
+    velocity = get_velocity()
+    if not current_app.config['VELOCITY_ENABLED'] or not velocity.warmed:
+        return
+    snapshot = get_fx_rates().snapshot()
+    amount_base, _ = snapshot.convert(transaction.amount, transaction.currency, snapshot.base)
+    velocity.record(transaction.sender_account_id, transaction.receiver_account_id, amount_base)
+
+# ==================== АУДИТ ====================
+def audit_event(action, user_id=None, **details):
+    """Событие аудита: только постановка в буфер, запись выполняет фоновый поток"""
+    if not current_app.config['AUDIT_ENABLED']:
+        return
+    if user_id is None:
+        user_id = session.get('user_id')
+    ip = request.remote_addr if has_request_context() else None
+    get_audit().record(action, user_id, ip, details or None)
+
+def query_audit(user_id=None, action=None, since=None, until=None, limit=100):
+    """Записи аудита, новые первыми; пользователь и период фильтруются по индексам"""
+    query = AuditLog.query
+    if user_id is not None:
+        query = query.filter(AuditLog.user_id == user_id)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if since:
+        query = query.filter(AuditLog.created_at >= since)
+    if until:
+        query = query.filter(AuditLog.created_at < until)
+    return query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit).all()
+
+# ==================== ОБРАБОТЧИКИ OUTBOX ====================
+# Примеры: события только пишутся в лог. Настоящую доставку (email, push, очередь
+# антифрода) подключают своими функциями с @outbox_handler('transfer.completed') и т.п.
+def notify_transfer_parties(payload):
+    """Пример: уведомление участников перевода в лог"""
+    print(f"📨 Перевод {payload['reference']}: пользователь {payload['sender_user_id']} -> "
+          f"{payload['receiver_user_id']}, {payload['amount']:.2f} {payload['currency']}")
+
+def report_flagged_transfer(payload):
+    """Пример: подозрительный перевод для ручной проверки в лог"""
+    print(f"🚩 Перевод {payload['reference']} требует проверки: {', '.join(payload['flags'])}")
+
+def register_example_outbox_handlers():
+    """Подключение примеров (OUTBOX_EXAMPLE_HANDLERS в config.py)"""
+    outbox_handler('transfer.completed')(notify_transfer_parties)
+    outbox_handler('transfer.flagged')(report_flagged_transfer)
+
+# ==================== ВАЛИДАЦИЯ ====================
+# Шаблоны компилируются один раз при импорте - валидация вызывается и для
+# каждой строки массового импорта
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+UPPERCASE_RE = re.compile(r'[A-Z]')
+LOWERCASE_RE = re.compile(r'[a-z]')
+DIGIT_RE = re.compile(r'\d')
+SPECIAL_RE = re.compile(r'[!@#$%^&*(),.?":{}|<>]')
+CYRILLIC_RE = re.compile(r'[а-яА-Я]')
+PHONE_RE = re.compile(
+    r'^\+7\s?\(\d{3}\)\s?\d{3}-\d{2}-\d{2}$'  # +7 (999) 123-45-67
+    r'|^\+7\d{10}$'                            # +79991234567
+    r'|^8\s?\(\d{3}\)\s?\d{3}-\d{2}-\d{2}$'    # 8 (999) 123-45-67
+    r'|^8\d{10}$'                               # 89991234567
+)
+
+def validate_email(email):
+    return bool(EMAIL_RE.match(email))
+
+def validate_password(password):
+    errors = []
+    if len(password) < 8:
+        errors.append("Минимум 8 символов")
+    if not UPPERCASE_RE.search(password):
+        errors.append("Хотя бы одна заглавная буква")
+    if not LOWERCASE_RE.search(password):
+        errors.append("Хотя бы одна строчная буква")
+    if not DIGIT_RE.search(password):
+        errors.append("Хотя бы одна цифра")
+    if not SPECIAL_RE.search(password):
+        errors.append("Хотя бы один спецсимвол")
+    if CYRILLIC_RE.search(password):
+        errors.append("Только латинские буквы")
+    return errors
+
+def validate_full_name(full_name):
+    if not full_name or len(full_name.strip()) < 2:
+        return ["Минимум 2 символа"]
+    if DIGIT_RE.search(full_name):
+        return ["Не должно содержать цифры"]
+    if len(full_name.strip()) > 100:
+        return ["Слишком длинное ФИО (максимум 100 символов)"]
+    return []
+
+def validate_phone(phone):
+    if not phone:
+        return []  # Телефон не обязателен
+    
+    if PHONE_RE.match(phone):
+        return []
+    
+    return ["Некорректный формат телефона. Примеры: +7 (999) 123-45-67, 89991234567"]
+
+# ==================== ИНИЦИАЛИЗАЦИЯ БАЗЫ ====================
+def add_missing_columns(engine=None, tables=None):
+    """Добавление новых nullable-колонок в уже существующие таблицы (create_all их не трогает)"""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as conn:
+        for table in tables or db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} '
+                                  f'ADD COLUMN {preparer.format_column(column)} {column_type}'))
+                print(f"✅ Добавлена колонка {table.name}.{column.name}")
+
+def protect_audit_log():
+    """В PostgreSQL журнал аудита защищается от UPDATE/DELETE триггером"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger AS $$
+            BEGIN
+                RAISE EXCEPTION 'audit_log допускает только добавление строк';
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text('DROP TRIGGER IF EXISTS audit_log_append_only ON audit_log'))
+        conn.execute(text('CREATE TRIGGER audit_log_append_only BEFORE UPDATE OR DELETE ON audit_log '
+                          'FOR EACH ROW EXECUTE PROCEDURE audit_log_append_only()'))
+
+def create_tables():
+    """Все таблицы в одной БД или каталог в основной БД и данные пользователей в шардах"""
+    if not sharding_enabled():
+        db.create_all()
+        add_missing_columns()
+        return
+    
+    tables = global_tables()
+    db.metadata.create_all(db.engine, tables=tables)
+    add_missing_columns(db.engine, tables)
+    for name in current_app.config['SHARDS']:
+        create_shard_schema(db.engines[name])
+        add_missing_columns(db.engines[name], [table for table in db.metadata.sorted_tables
+                                               if table.info.get('sharded')])
+        print(f"✅ Шард {name}: таблицы созданы")
+
+def fix_account_numbers():
+    # Проверяем и обновляем существующие номера счетов если они слишком длинные
+    accounts = Account.query.all()
+    for account in accounts:
+        if len(account.account_number) != 20:
+            # Генерируем новый правильный номер счета
+            new_number = generate_account_number(account.user_id, account.account_type)
+            print(f"⚠️ Исправляю номер счета: {account.account_number} -> {new_number}")
+            if sharding_enabled():
+                AccountDirectory.query.filter_by(account_id=account.id).update({'account_number': new_number})
+            account.account_number = new_number
+    
+    if accounts:
+        db.session.commit()
+    return len(accounts)
+
+def create_user_accounts():
+    users = User.query.all()
+    for user in users:
+        existing_accounts = Account.query.filter_by(user_id=user.id).first()
+        if not existing_accounts:
+            # Используем исправленную функцию генерации
+            account_number = generate_account_number(user.id, 'current')
+            
+            # Проверяем длину
+            if len(account_number) != 20:
+                print(f"⚠️ Предупреждение: номер счета {account_number} не 20 символов ({len(account_number)} символов)")
+                # Дополняем или обрезаем до 20 символов
+                if len(account_number) < 20:
+                    account_number = account_number.ljust(20, '0')
+                else:
+                    account_number = account_number[:20]
+            
+            current_account = Account(
+                user_id=user.id,
+                account_number=account_number,
+                account_type='current',
+                balance=100000.00 if user.role == 'admin' else random.uniform(5000, 50000),
+                status='active'
+            )
+            register_account(current_account)
+            db.session.add(current_account)
+            
+            if user.role == 'client' and random.random() > 0.3:
+                savings_account_number = generate_account_number(user.id, 'savings')
+                if len(savings_account_number) != 20:
+                    if len(savings_account_number) < 20:
+                        savings_account_number = savings_account_number.ljust(20, '0')
+                    else:
+                        savings_account_number = savings_account_number[:20]
+                
+                savings_account = Account(
+                    user_id=user.id,
+                    account_number=savings_account_number,
+                    account_type='savings',
+                    balance=random.uniform(10000, 100000),
+                    interest_rate=random.uniform(3.5, 7.0),
+                    status='active'
+                )
+                register_account(savings_account)
+                db.session.add(savings_account)
+            
+            print(f"✅ Счета созданы для пользователя: {user.email}")
+    
+    db.session.commit()
+
+def create_test_transactions():
+    # При шардировании тестовые операции создаются между счетами одного шарда
+    accounts = Account.query.all()
+    
+    if accounts and len(accounts) >= 2:
+        for i in range(5):
+            sender = random.choice(accounts)
+            receiver = random.choice([acc for acc in accounts if acc.id != sender.id])
+            
+            amount = random.uniform(100, 5000)
+            
+            transaction = Transaction(
+                transaction_type='transfer',
+                sender_user_id=sender.user_id,
+                receiver_user_id=receiver.user_id,
+                sender_account_id=sender.id,
+                receiver_account_id=receiver.id,
+                amount=amount,
+                description=f'Тестовая транзакция #{i+1}',
+                status='completed'
+            )
+            transaction.reference_number = transaction.generate_reference()
+            db.session.add(transaction)
+        
+        db.session.commit()
+        return True
+    return False
+
+def bump_all_user_versions():
+    bump_change_versions(*(user_scope(user_id) for (user_id,) in db.session.query(User.id)))
+    db.session.commit()
+
+def users_summary():
+    return [(user, Account.query.filter_by(user_id=user.id).all()) for user in User.query.all()]
+
+def init_database():
+    """Создание таблиц и тестовых данных (вызывается командой flask init-db)"""
+    try:
+        print("🔧 Создание таблиц...")
+        create_tables()
+        protect_audit_log()
+        print("✅ Таблицы созданы")
+        
+        if any(fan_out(fix_account_numbers)):
+            print("✅ Номера счетов проверены и исправлены")
+        
+        admin_data = {
+            'full_name': 'Администратор Банка',
+            'email': 'admin@bank.ru',
+            'password': 'Admin123!',
+            'role': 'admin',
+            'phone': '+7 (999) 123-45-67',
+            'address': 'Москва, ул. Банковская, д. 1'
+        }
+        
+        test_users = [
+            {
+                'full_name': 'Тестовый Пользователь',
+                'email': 'user@test.ru',
+                'password': 'User123!',
+                'role': 'client',
+                'phone': '+7 (999) 111-22-33',
+                'address': 'Москва, ул. Тестовая, д. 10'
+            },
+            {
+                'full_name': 'Иванов Иван Иванович',
+                'email': 'ivanov@example.ru',
+                'password': 'Ivanov123!',
+                'role': 'client',
+                'phone': '+7 (999) 222-33-44',
+                'address': 'Санкт-Петербург, Невский пр., д. 25'
+            },
+            {
+                'full_name': 'Петрова Мария Сергеевна',
+                'email': 'petrova@example.ru',
+                'password': 'Petrova123!',
+                'role': 'client',
+                'phone': '+7 (999) 333-44-55',
+                'address': 'Екатеринбург, ул. Ленина, д. 50'
+            }
+        ]
+        
+        for user_data in [admin_data] + test_users:
+            existing_user = find_user_by_email(user_data['email'])
+            if not existing_user:
+                new_user = User(
+                    full_name=user_data['full_name'],
+                    email=user_data['email'],
+                    role=user_data['role'],
+                    phone=user_data['phone'],
+                    address=user_data['address']
+                )
+                new_user.set_password(user_data['password'])
+                # Пользователь фиксируется сразу: следующий может попасть в другой шард
+                place_new_user(new_user)
+                db.session.add(new_user)
+                db.session.commit()
+                if new_user.role == 'admin':
+                    print("✅ Администратор создан")
+                else:
+                    print(f"✅ Создан пользователь: {user_data['email']}")
+        
+        fan_out(create_user_accounts)
+        
+        print("🔧 Создание тестовых транзакций...")
+        if any(fan_out(create_test_transactions)):
+            print("✅ Тестовые транзакции созданы")
+        
+        # Тестовые транзакции пишутся мимо apply_transfer - пересчитываем итоги
+        rollups_count = sum(fan_out(rebuild_monthly_rollups))
+        print(f"✅ Помесячные итоги пересчитаны ({rollups_count} строк)")
+        
+        # ...и сбрасываем закэшированные браузерами страницы пользователей
+        fan_out(bump_all_user_versions)
+        
+        print("=" * 60)
+        print("🎉 БАЗА ДАННЫХ POSTGRESQL УСПЕШНО ИНИЦИАЛИЗИРОВАНА!")
+        print("=" * 60)
+        print("\n👥 СОЗДАНЫ ПОЛЬЗОВАТЕЛИ:")
+        for shard_users in fan_out(users_summary):
+            for user, accounts in shard_users:
+                role_icon = '👑' if user.role == 'admin' else '👤'
+                print(f"   {role_icon} {user.full_name} ({user.email})")
+                for acc in accounts:
+                    print(f"      Счет: {acc.account_number} ({len(acc.account_number)} символов) - {acc.balance:.2f} {acc.currency}")
+        print("=" * 60)
+        
+    except Exception as e:
+        print(f"❌ Ошибка при инициализации базы данных: {e}")
+        import traceback
+        traceback.print_exc()
+        try:
+            db.session.rollback()
+        except:
+            pass
@@ -0,0 +1,210 @@
+"""Горизонтальное шардирование по user_id.
+
+Пользователь, его счета, операции, итоги, плановые переводы и outbox живут в
+одном шарде (таблицы с info={'sharded': True} в models.py). Шард запроса
+лежит в db.session.info['shard'] и выбирается по вошедшему пользователю,
+поэтому маршруты одного пользователя (dashboard, history, profile) обращаются
+только к его шарду без изменений в запросах.
+
+Основная БД хранит глобальный каталог: user_directory (email -> id, шард) и
+account_directory (номер счета -> id, шард), а также журнал межшардовых
+переводов (saga.py). id пользователей и счетов выдает каталог, поэтому они
+уникальны во всех шардах. Без SHARDS в конфигурации функции модуля работают с
+одной БД, как раньше.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, session
+from sqlalchemy import MetaData
+
+from extensions import db, get_shards
+from models import User, Account, UserDirectory, AccountDirectory
+
+
+class ShardRouter:
+    def __init__(self, app, shards, workers=8):
+        self.app = app
+        self.names = sorted(shards)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(self.names))),
+                                        thread_name_prefix='shard')
+
+    def shard_for_new_user(self, user_id):
+        """Карта user_id -> шард для новых пользователей; дальше шард берется из каталога"""
+        return self.names[user_id % len(self.names)]
+
+    def _run(self, shard, fn, args):
+        # Свой контекст приложения - своя сессия: шарды не делят соединения и identity map
+        with self.app.app_context():
+            db.session.info['shard'] = shard
+            return fn(*args)
+
+    def run_on(self, shard, fn, *args):
+        """fn(*args) в отдельной сессии шарда (None - только основная БД) в текущем потоке"""
+        return self._run(shard, fn, args)
+
+    def fan_out(self, fn, *args):
+        """fn(*args) параллельно на всех шардах; результаты в порядке self.names"""
+        futures = [self._pool.submit(self._run, name, fn, args) for name in self.names]
+        return [future.result() for future in futures]
+
+
+def init_app(app):
+    """Подключение шардов как binds Flask-SQLAlchemy (до db.init_app)"""
+    shards = app.config['SHARDS']
+    if not shards:
+        return
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **shards}
+    app.before_request(bind_request_shard)
+
+
+def sharding_enabled():
+    return bool(current_app.config['SHARDS'])
+
+
+def current_shard():
+    return db.session.info.get('shard')
+
+
+def use_shard(shard):
+    db.session.info['shard'] = shard
+
+
+def shard_of_user(user_id):
+    return db.session.query(UserDirectory.shard).filter_by(user_id=user_id).scalar()
+
+
+def bind_request_shard():
+    """Шард запроса - шард вошедшего пользователя (запоминается в сессии Flask)"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return
+    shard = session.get('shard')
+    if shard is None:
+        shard = session['shard'] = shard_of_user(user_id)
+    use_shard(shard)
+
+
+def fan_out(fn, *args):
+    """fn(*args) на каждом шарде параллельно; без шардов - один вызов в текущей сессии"""
+    if not sharding_enabled():
+        return [fn(*args)]
+    return get_shards().fan_out(fn, *args)
+
+
+def on_user_shard(user_id, fn, *args):
+    """fn(*args) в шарде пользователя: в сессии запроса, если это ее шард"""
+    if not sharding_enabled():
+        return fn(*args)
+    shard = shard_of_user(user_id)
+    if shard == current_shard():
+        return fn(*args)
+    return get_shards().run_on(shard, fn, *args)
+
+
+def load_detached(model, ident):
+    obj = db.session.get(model, ident)
+    if obj is not None:
+        db.session.expunge(obj)
+    return obj
+
+
+def is_remote(obj):
+    """Объект загружен из другого шарда и не принадлежит сессии запроса"""
+    return sharding_enabled() and obj not in db.session
+
+# ==================== ГЛОБАЛЬНЫЙ КАТАЛОГ ====================
+
+def find_user_by_email(email):
+    """Пользователь по email; при шардировании сессия переключается на его шард"""
+    if not sharding_enabled():
+        return User.query.filter_by(email=email).first()
+    entry = UserDirectory.query.filter_by(email=email).first()
+    if entry is None or entry.shard is None:
+        return None
+    use_shard(entry.shard)
+    return db.session.get(User, entry.user_id)
+
+
+def place_new_user(user):
+    """id и шард нового пользователя из каталога; сессия переключается на этот шард"""
+    if not sharding_enabled():
+        return
+    entry = UserDirectory(email=user.email)
+    db.session.add(entry)
+    db.session.flush()
+    entry.shard = get_shards().shard_for_new_user(entry.user_id)
+    user.id = entry.user_id
+    use_shard(entry.shard)
+
+
+def register_account(account):
+    """id нового счета из каталога и запись номер -> шард (шард текущей сессии)"""
+    if not sharding_enabled():
+        return
+    entry = AccountDirectory(account_number=account.account_number,
+                             user_id=account.user_id, shard=current_shard())
+    db.session.add(entry)
+    db.session.flush()
+    account.id = entry.account_id
+
+
+def delete_user_rows(user_ids):
+    """Удаление пользователей и их счетов из текущего шарда (компенсация создания)"""
+    db.session.execute(db.delete(Account).where(Account.user_id.in_(user_ids)))
+    db.session.execute(db.delete(User).where(User.id.in_(user_ids)))
+    db.session.commit()
+
+
+def delete_directory_entries(user_ids):
+    db.session.execute(db.delete(AccountDirectory).where(AccountDirectory.user_id.in_(user_ids)))
+    db.session.execute(db.delete(UserDirectory).where(UserDirectory.user_id.in_(user_ids)))
+    db.session.commit()
+
+
+def forget_new_user(user_id, shard):
+    """Компенсация прерванной регистрации: пользователь, счета и записи каталога.
+
+    Каталог и шард фиксируются разными commit, поэтому после сбоя могла
+    остаться любая их часть - удаляем все, что выдано этой регистрации.
+    """
+    if not sharding_enabled():
+        delete_user_rows([user_id])
+        return
+    router = get_shards()
+    router.run_on(shard, delete_user_rows, [user_id])
+    router.run_on(None, delete_directory_entries, [user_id])
+
+
+def find_account_by_number(account_number):
+    """Счет по номеру через глобальный индекс; счет другого шарда отсоединен от сессии"""
+    if not sharding_enabled():
+        return Account.query.filter_by(account_number=account_number).first()
+    entry = AccountDirectory.query.filter_by(account_number=account_number).first()
+    if entry is None:
+        return None
+    if entry.shard == current_shard():
+        return db.session.get(Account, entry.account_id)
+    return get_shards().run_on(entry.shard, load_detached, Account, entry.account_id)
+
+
+def shard_of_account(account_id):
+    return db.session.query(AccountDirectory.shard).filter_by(account_id=account_id).scalar()
+
+# ==================== СХЕМА ====================
+
+def shard_tables():
+    return [table for table in db.metadata.sorted_tables if table.info.get('sharded')]
+
+
+def global_tables():
+    return [table for table in db.metadata.sorted_tables if not table.info.get('sharded')]
+
+
+def create_shard_schema(engine):
+    """Таблицы шарда без внешних ключей: операция ссылается на счет и владельца из другого шарда"""
+    metadata = MetaData()
+    for table in shard_tables():
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            copy.constraints.discard(constraint)
+    metadata.create_all(engine)
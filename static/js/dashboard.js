@@ -0,0 +1,90 @@
+// Живое обновление личного кабинета через Server-Sent Events
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.EventSource) {
+        return;
+    }
+
+    const RECENT_LIMIT = 5;
+    const totalBalance = document.getElementById('totalBalance');
+    const recentTransactions = document.getElementById('recentTransactions');
+    let source = null;
+    let retryDelay = 5000;
+
+    const CURRENCY_SYMBOLS = { RUB: '₽', USD: '$', EUR: '€', CNY: '¥', KZT: '₸' };
+
+    function formatAmount(value, currency) {
+        return value.toFixed(2) + ' ' + (CURRENCY_SYMBOLS[currency || 'RUB'] || currency);
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function onBalance(event) {
+        const data = JSON.parse(event.data);
+        const card = document.querySelector('[data-account-id="' + data.account_id + '"]');
+        if (!card) {
+            return;
+        }
+        card.querySelector('.account-balance').textContent = formatAmount(data.balance, data.currency);
+        // Итог в базовой валюте сервер считает сам - на клиенте нет курсов
+        if (totalBalance) {
+            totalBalance.textContent = formatAmount(data.total_balance, data.base_currency);
+        }
+    }
+
+    function onTransaction(event) {
+        const data = JSON.parse(event.data);
+
+        // Таблицы еще нет (первая операция) - один раз перерисовываем страницу
+        if (!recentTransactions) {
+            window.location.reload();
+            return;
+        }
+
+        const row = document.createElement('tr');
+        const amountClass = data.amount < 0 ? 'text-danger' : 'text-success';
+        const sign = data.amount < 0 ? '-' : '+';
+        row.innerHTML = `
+            <td>${escapeHtml(data.date)}</td>
+            <td>${escapeHtml(data.description)}</td>
+            <td class="${amountClass}">${sign} ${formatAmount(Math.abs(data.amount), data.currency)}</td>
+            <td><span class="badge bg-success">Выполнено</span></td>
+        `;
+        recentTransactions.prepend(row);
+
+        while (recentTransactions.rows.length > RECENT_LIMIT) {
+            recentTransactions.deleteRow(-1);
+        }
+
+        if (data.type === 'incoming') {
+            showNotification('Поступление: ' + formatAmount(data.amount, data.currency), 'success');
+        }
+    }
+
+    function connect() {
+        source = new EventSource('/events');
+        source.addEventListener('open', function() {
+            retryDelay = 5000;
+        });
+        source.addEventListener('balance', onBalance);
+        source.addEventListener('transaction', onTransaction);
+        source.addEventListener('error', function() {
+            // Обрыв браузер переподключает сам, а на ответ 503 (все места под потоки
+            // заняты) закрывает поток насовсем - повторяем с растущей паузой
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 120000);
+            }
+        });
+    }
+
+    connect();
+
+    // Закрываем соединение при уходе со страницы, чтобы не держать воркер
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
+});
@@ -0,0 +1,39 @@
+// Помесячный график поступлений и списаний (данные из /api/analytics/monthly)
+document.addEventListener('DOMContentLoaded', async function() {
+    const chart = document.getElementById('monthlyChart');
+    if (!chart) {
+        return;
+    }
+
+    let data;
+    try {
+        data = await loadData('/api/analytics/monthly?months=12');
+    } catch (error) {
+        chart.innerHTML = '<div class="text-muted">Не удалось загрузить статистику</div>';
+        return;
+    }
+
+    if (!data.months.length) {
+        chart.innerHTML = '<div class="text-muted">Операций пока нет</div>';
+        return;
+    }
+
+    const months = data.months.slice().reverse();
+    const maxAmount = Math.max(...months.map(m => Math.max(m.incoming_amount, m.outgoing_amount)), 1);
+
+    chart.innerHTML = '';
+    months.forEach(function(m) {
+        const row = document.createElement('div');
+        row.className = 'chart-row';
+        row.innerHTML = `
+            <div class="chart-month">${m.month}</div>
+            <div class="chart-bars">
+                <div class="chart-bar bg-success" style="width: ${m.incoming_amount / maxAmount * 100}%"
+                     title="Поступления: ${formatMoney(m.incoming_amount)} (${m.incoming_count})"></div>
+                <div class="chart-bar bg-danger" style="width: ${m.outgoing_amount / maxAmount * 100}%"
+                     title="Списания: ${formatMoney(m.outgoing_amount)} (${m.outgoing_count})"></div>
+            </div>
+        `;
+        chart.appendChild(row);
+    });
+});
@@ -1,10 +1,6 @@
-import sys
 import os
 
-# Добавляем путь к проекту
-path = '/home/ваш_username/bank-app'  # Измените на ваш путь
-if path not in sys.path:
-    sys.path.append(path)
+from app import create_app
 
-# Импортируем приложение
-from app import app as application
\ No newline at end of file
+# Для gunicorn: gunicorn -c gunicorn.conf.py wsgi:application
+application = create_app(os.environ.get('FLASK_CONFIG', 'production'))